@@ -50,6 +50,147 @@ def parse_args():
         help='Directory to store CSV output files (default: current directory)'
     )
     
+    # Scraping engine
+    parser.add_argument(
+        '--engine', 
+        choices=['sync', 'async'],
+        default='sync',
+        help='Scraping engine: one synchronous page, or an asyncio pool of pages (default: sync)'
+    )
+    
+    # Number of concurrent pages for the async engine
+    parser.add_argument(
+        '--concurrency', 
+        type=int, 
+        default=4, 
+        help='Number of browser pages scraping at once with --engine async (default: 4)'
+    )
+    
+    # Global request rate cap for detail pages
+    parser.add_argument(
+        '--max-rps', 
+        type=float, 
+        default=2.0, 
+        help='Highest request rate per host the adaptive rate limiter may reach (default: 2.0, use 0 for no rate cap)'
+    )
+    
+    # How agency detail pages are fetched
+    parser.add_argument(
+        '--fetch-mode', 
+        choices=['browser', 'http'],
+        default='browser',
+        help='Fetch detail pages in the browser, or over plain HTTP with a browser fallback (default: browser)'
+    )
+    
+    # Background logo downloads
+    parser.add_argument(
+        '--logo-workers', 
+        type=int, 
+        default=4, 
+        help='Number of background threads downloading logos (default: 4)'
+    )
+    
+    # Request interception
+    parser.add_argument(
+        '--block-resources', 
+        nargs='*', 
+        choices=['image', 'media', 'font', 'stylesheet', 'script', 'xhr', 'fetch', 'other'],
+        default=['image', 'media', 'font', 'stylesheet'],
+        help='Resource types to abort in the browser (default: image media font stylesheet; pass no values to load everything)'
+    )
+    
+    parser.add_argument(
+        '--allow-trackers', 
+        action='store_true',
+        help='Do not block known analytics and ad tracker domains'
+    )
+    
+    # Incremental re-crawl
+    parser.add_argument(
+        '--refresh', 
+        action='store_true',
+        help='Re-fetch details only for new or changed agencies and flag agencies no longer listed as removed'
+    )
+    
+    # Continue an interrupted run
+    parser.add_argument(
+        '--resume', 
+        action='store_true',
+        help='Continue the last unfinished session: skip finished categories and listing pages already stored'
+    )
+    
+    # Multi-process crawl
+    parser.add_argument(
+        '--workers', 
+        type=int, 
+        default=0, 
+        help='Number of worker processes, each with its own browser, sharing a leased work queue (default: 0, scrape in this process)'
+    )
+    
+    parser.add_argument(
+        '--lease-seconds', 
+        type=int, 
+        default=300, 
+        help='Seconds before a task held by an unresponsive worker can be claimed by another (default: 300)'
+    )
+    
+    # Site to scrape
+    parser.add_argument(
+        '--base-url', 
+        default='https://www.i-boss.co.kr',
+        help='Root URL of the directory to scrape, e.g. the local mock site http://127.0.0.1:8800 (default: https://www.i-boss.co.kr)'
+    )
+    
+    # Record and replay network traffic
+    parser.add_argument(
+        '--record-har', 
+        metavar='PATH', 
+        help='Record every browser request and response of the run to a HAR archive (use a .zip path to compress it)'
+    )
+    
+    parser.add_argument(
+        '--replay-har', 
+        metavar='PATH', 
+        help='Serve every browser request from a recorded HAR archive instead of the network'
+    )
+    
+    # Multi-host crawl
+    parser.add_argument(
+        '--serve', 
+        metavar='HOST:PORT', 
+        help='Run the coordinator service on HOST:PORT and hand out tasks to workers started with --join'
+    )
+    
+    parser.add_argument(
+        '--join', 
+        metavar='URL', 
+        help='Work for the coordinator service at URL (e.g. http://10.0.0.5:8765); results are stored by the coordinator'
+    )
+    
+    # Output
+    parser.add_argument(
+        '--export-format', 
+        nargs='+', 
+        choices=['csv', 'parquet'], 
+        default=['csv'], 
+        help='Formats the results are exported in; parquet writes typed, zstd-compressed files with agencies '
+             'partitioned by category_name and needs pyarrow (default: csv)'
+    )
+    
+    # Live metrics
+    parser.add_argument(
+        '--metrics-port', 
+        type=int, 
+        default=0, 
+        help='Serve OpenMetrics/Prometheus crawl metrics on http://HOST:PORT/metrics (default: 0, off)'
+    )
+    
+    parser.add_argument(
+        '--metrics-host', 
+        default='127.0.0.1', 
+        help='Address the metrics endpoint listens on (default: 127.0.0.1; use 0.0.0.0 for remote scrapers)'
+    )
+    
     return parser.parse_args()
 
 
@@ -61,4 +202,23 @@ if __name__ == "__main__":
     print(f"Headless mode: {args.headless}")
     print(f"Skip details: {args.skip_details}")
     print(f"Database path: {args.db_path}")
-    print(f"Output directory: {args.output_dir}")
\ No newline at end of file
+    print(f"Output directory: {args.output_dir}")
+    print(f"Engine: {args.engine}")
+    print(f"Concurrency: {args.concurrency}")
+    print(f"Max requests per second: {args.max_rps}")
+    print(f"Fetch mode: {args.fetch_mode}")
+    print(f"Logo workers: {args.logo_workers}")
+    print(f"Blocked resource types: {args.block_resources}")
+    print(f"Allow trackers: {args.allow_trackers}")
+    print(f"Refresh: {args.refresh}")
+    print(f"Resume: {args.resume}")
+    print(f"Workers: {args.workers}")
+    print(f"Lease seconds: {args.lease_seconds}")
+    print(f"Base URL: {args.base_url}")
+    print(f"Record HAR: {args.record_har}")
+    print(f"Replay HAR: {args.replay_har}")
+    print(f"Serve: {args.serve}")
+    print(f"Join: {args.join}")
+    print(f"Export formats: {args.export_format}")
+    print(f"Metrics port: {args.metrics_port}")
+    print(f"Metrics host: {args.metrics_host}")
\ No newline at end of file
@@ -0,0 +1,522 @@
+import asyncio
+import functools
+import re
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from tqdm import tqdm
+from iboss_scraper import IBossScraper, AGENCY_LIST_JS, finish_session
+from pagination import (
+    PAGINATION_LINKS_JS, PAGINATION_SELECTORS, build_page_url,
+    estimate_page_count, learn_page_url_scheme
+)
+from waits import (
+    DETAIL_INTRO_SELECTORS, listing_signature, wait_for_detail_intro,
+    wait_for_listing_change, wait_for_listing_rows
+)
+
+
+class AsyncIBossScraper(IBossScraper):
+    """Asyncio engine that shares one browser across a pool of concurrent pages"""
+
+    def __init__(self, concurrency=4, **kwargs):
+        self.concurrency = max(1, concurrency)
+        super().__init__(**kwargs)
+
+    def _start_browser(self):
+        """Defer browser startup until the event loop is running (see start)"""
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.pages = []
+        self.page_pool = None
+
+    async def start(self):
+        """Launch the browser and open a pool of pages"""
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        self.context = await self.browser.new_context(**self.context_options())
+        if self.resource_filter.enabled:
+            await self.context.route("**/*", self.resource_filter.handle_route_async)
+        if self.replay_har:
+            # Registered last so it answers first; anything not in the archive is aborted
+            await self.context.route_from_har(self.replay_har, not_found="abort")
+
+        self.page_pool = asyncio.Queue()
+        for _ in range(self.concurrency):
+            page = await self.context.new_page()
+            page.set_default_timeout(30000)
+            self.pages.append(page)
+            self.page_pool.put_nowait(page)
+
+        print(f"Browser started with {self.concurrency} concurrent pages")
+
+    @asynccontextmanager
+    async def acquire_page(self):
+        """Borrow a page from the pool for the duration of the block"""
+        page = await self.page_pool.get()
+        try:
+            yield page
+        finally:
+            self.page_pool.put_nowait(page)
+
+    async def _in_thread(self, func, *args, **kwargs):
+        """Run a blocking call in the default executor so the other pages keep going
+
+        Database writes wait for the writer thread to commit and reads flush
+        queued writes first, so they must not run on the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def navigate_to_url(self, page, url, retries=3):
+        """Navigate a pooled page to a URL and handle loading"""
+        for attempt in range(retries):
+            if attempt:
+                self.navigation_retries += 1
+            try:
+                # Check if URL is absolute, if not make it absolute
+                if not url.startswith(('http://', 'https://')):
+                    url = f"{self.base_url}{url}"
+
+                print(f"Navigating to: {url}")
+                # The limiter waits out the backoff of earlier failures before the next attempt
+                async with self.rate_limiter.request_async(url) as request:
+                    with self.timings.stage('navigate'):
+                        response = await page.goto(url, wait_until="domcontentloaded")
+                    if response:
+                        request.record(response.status, response.headers.get("retry-after"))
+                if request.throttled:
+                    print(f"Server returned {request.status} for {url} (attempt {attempt+1}/{retries})")
+                    continue
+                with self.timings.stage('network_idle'):
+                    await page.wait_for_load_state("networkidle")
+                return True
+            except Exception as e:
+                print(f"Error navigating to {url} (attempt {attempt+1}/{retries}): {e}")
+        return False
+
+    async def get_categories(self):
+        """Get all agency categories from the main page"""
+        print("Extracting agency categories...")
+        selector = "#_LF_agency_dir > div.bg_fff.fix_1050 > div:nth-child(1) > div.category_wrap > ul > li > a"
+
+        try:
+            async with self.acquire_page() as page:
+                # Navigate to the main directory page
+                await self.navigate_to_url(page, f"{self.base_url}/ab-7553")
+
+                # Wait for the categories to load
+                await page.wait_for_selector(selector)
+
+                # Read every category link in a single round-trip
+                raw_categories = await page.eval_on_selector_all(
+                    selector,
+                    "elements => elements.map(e => ({text: e.innerText, href: e.getAttribute('href')}))"
+                )
+
+            self.progress.set('categories_total', len(raw_categories))
+
+            categories_data = []
+            for raw in raw_categories:
+                try:
+                    text_parts = raw['text'].split('\n')
+
+                    category_name = text_parts[0] if text_parts else ""
+                    agency_count = text_parts[1].replace('개의 대행사', '').strip() if len(text_parts) > 1 else "0"
+                    category_link = raw['href']
+
+                    # Make sure we have absolute URLs
+                    if not category_link.startswith(('http://', 'https://')):
+                        category_link = f"{self.base_url}{category_link}"
+
+                    # Store in database
+                    category_id = self.db.insert_category(category_name, category_link, agency_count)
+
+                    categories_data.append({
+                        'id': category_id,
+                        'category_name': category_name,
+                        'category_link': category_link,
+                        'agency_count': agency_count
+                    })
+                except Exception as e:
+                    print(f"Error extracting category data: {e}")
+
+            print(f"Extracted {len(categories_data)} categories")
+            return categories_data
+
+        except Exception as e:
+            print(f"Error getting categories: {e}")
+            return []
+
+    async def _go_to_next_page(self, page):
+        """Click the pagination link after the current page, returning False on the last page"""
+        pagination = None
+        for selector in PAGINATION_SELECTORS:
+            pagination = await page.query_selector(selector)
+            if pagination:
+                break
+
+        if not pagination:
+            print("No pagination controls found, assuming this is the only page")
+            return False
+
+        page_links = (await pagination.query_selector_all("a")
+                      or await pagination.query_selector_all("button")
+                      or await pagination.query_selector_all("span[onclick]"))
+        if not page_links:
+            print("No pagination links found, assuming this is the only page")
+            return False
+
+        next_button = None
+        next_text_patterns = ['다음', '>', 'next', '→', '▶', 'Next Page', '다음 페이지']
+
+        for elem in page_links:
+            elem_text = (await elem.inner_text()).strip()
+            elem_html = (await elem.inner_html()).lower()
+            aria_label = (await elem.get_attribute('aria-label') or '').lower()
+
+            if (any(pattern in elem_text for pattern in next_text_patterns)
+                    or "next" in elem_html or "arr" in elem_html or "right" in elem_html
+                    or any(pattern in aria_label for pattern in ['next', '다음'])):
+                next_button = elem
+                break
+
+        # If still not found, look for the numbered link after the current page
+        if not next_button and len(page_links) > 1:
+            current_page_num = None
+            for elem in page_links:
+                class_attr = await elem.get_attribute('class') or ''
+                if ('LF_page_link_current' in class_attr) or ('active' in class_attr) or ('current' in class_attr):
+                    try:
+                        current_page_num = int((await elem.inner_text()).strip())
+                    except ValueError:
+                        pass
+                    break
+
+            if current_page_num is not None:
+                for elem in page_links:
+                    try:
+                        if int((await elem.inner_text()).strip()) == current_page_num + 1:
+                            next_button = elem
+                            break
+                    except ValueError:
+                        continue
+            else:
+                last_link = page_links[-1]
+                last_text = (await last_link.inner_text()).strip()
+                if last_text not in ['처음', '첫 페이지', '<<', 'first', '맨앞']:
+                    next_button = last_link
+
+        if not next_button:
+            print("No next button found, reached last page")
+            return False
+
+        # Check if the button is disabled
+        cls = await next_button.get_attribute('class') or ''
+        if 'disabled' in cls or 'none' in cls:
+            print(f"Next button is disabled (class: {cls}), reached last page")
+            return False
+
+        previous_signature = await listing_signature(page)
+        await next_button.click()
+        try:
+            # Wait for the current-page marker and rows to change
+            await wait_for_listing_change(page, previous_signature)
+        except Exception as e:
+            print(f"Listing did not change after clicking next, assuming last page: {e}")
+            return False
+        return True
+
+    async def _scrape_page_by_url(self, url):
+        """Load one listing page by URL on a pooled page and extract its rows"""
+        async with self.acquire_page() as page:
+            if not await self.navigate_to_url(page, url):
+                return []
+            try:
+                with self.timings.stage('wait_listing'):
+                    await wait_for_listing_rows(page)
+            except Exception:
+                print(f"No agency rows found at {url}")
+                return []
+            with self.timings.stage('extract_listing'):
+                return await page.evaluate(AGENCY_LIST_JS)
+
+    async def get_agencies_in_category(self, category_id, category_name, category_url, agency_count=None):
+        """Get all agencies within a specific category using pooled pages"""
+        print(f"\nExtracting agencies for category: {category_name}")
+        agencies_data = []
+
+        # Pages stored by the interrupted run of a resumed session
+        done_pages = await self._in_thread(self.db.get_done_pages, self.session_id, category_id) if self.resume else set()
+
+        async def store(raw_agencies, page_number):
+            if page_number in done_pages:
+                print(f"[{category_name}] Page {page_number} was stored before the restart, skipping")
+                return False
+            return await self._in_thread(
+                self.store_agencies, category_id, category_name, raw_agencies, agencies_data, page=page_number
+            )
+
+        try:
+            async with self.acquire_page() as page:
+                # Navigate to category page
+                await self.navigate_to_url(page, category_url)
+
+                try:
+                    with self.timings.stage('wait_listing'):
+                        await page.wait_for_selector("div._list > div", timeout=10000)
+                except Exception as e:
+                    print(f"Warning: Agency list not found immediately for {category_name}: {e}")
+                    try:
+                        with self.timings.stage('wait_listing'):
+                            await wait_for_listing_rows(page, timeout=5000)
+                    except Exception:
+                        print(f"[{category_name}] Still no agency rows after waiting")
+
+                # Extract every agency row on the page in a single round-trip
+                with self.timings.stage('extract_listing'):
+                    raw_agencies = await page.evaluate(AGENCY_LIST_JS)
+                previous_first_row = raw_agencies[0] if raw_agencies else None
+                reached_limit = await store(raw_agencies, 1)
+                # Only a walk that reaches the last page can tell which agencies are gone
+                complete = bool(raw_agencies) and not reached_limit
+
+                page_scheme = None
+                total_pages = None
+                if raw_agencies and not reached_limit:
+                    links = await page.evaluate(PAGINATION_LINKS_JS)
+                    page_scheme = learn_page_url_scheme(page.url, links)
+                    total_pages = estimate_page_count(agency_count, len(raw_agencies), self.max_agencies_per_category)
+
+                    if not page_scheme:
+                        # No usable page URLs, so click through the pages in order
+                        print(f"[{category_name}] No page URL scheme found, paginating by clicking")
+                        current_page = 1
+                        while not reached_limit:
+                            try:
+                                with self.timings.stage('paginate_click'):
+                                    clicked = await self._go_to_next_page(page)
+                                if not clicked:
+                                    break
+                            except Exception as e:
+                                print(f"Error with pagination: {e}")
+                                complete = False
+                                break
+
+                            current_page += 1
+                            print(f"[{category_name}] Processing page {current_page}...")
+                            with self.timings.stage('extract_listing'):
+                                raw_agencies = await page.evaluate(AGENCY_LIST_JS)
+                            if not raw_agencies or raw_agencies[0] == previous_first_row:
+                                break
+                            previous_first_row = raw_agencies[0]
+                            reached_limit = await store(raw_agencies, current_page)
+                        complete = complete and not reached_limit
+
+            # The first page is back in the pool, so the other pages can use it
+            if page_scheme and not reached_limit:
+                print(f"[{category_name}] Paginating by URL parameter '{page_scheme['param']}' ({total_pages or 'unknown'} pages)")
+                if total_pages:
+                    # Every page URL is known up front, so fetch them all in parallel
+                    page_numbers = [n for n in range(2, total_pages + 1) if n not in done_pages]
+                    pages = await asyncio.gather(*(
+                        self._scrape_page_by_url(build_page_url(page_scheme, page_number))
+                        for page_number in page_numbers
+                    ))
+                    # A page that came back empty may have failed to load
+                    complete = all(pages)
+                    for page_number, raw_agencies in zip(page_numbers, pages):
+                        if not raw_agencies:
+                            continue
+                        if await store(raw_agencies, page_number):
+                            complete = False
+                            reached_limit = True
+                            break
+                else:
+                    # Unknown page count: walk pages by URL until one is empty or repeats
+                    page_number = 2
+                    while True:
+                        # Jump over pages stored before a restart
+                        while page_number in done_pages:
+                            page_number += 1
+                        raw_agencies = await self._scrape_page_by_url(build_page_url(page_scheme, page_number))
+                        if not raw_agencies or raw_agencies[0] == previous_first_row:
+                            break
+                        previous_first_row = raw_agencies[0]
+                        if await store(raw_agencies, page_number):
+                            complete = False
+                            reached_limit = True
+                            break
+                        page_number += 1
+
+            await self._in_thread(self.finish_category, category_id, category_name, agencies_data, complete, reached_limit)
+            return agencies_data
+
+        except Exception as e:
+            print(f"Error getting agencies for category {category_name}: {e}")
+            return []
+
+    async def get_agency_detail(self, agency_id, agency_name, agency_idx, agency_detail_url):
+        """Get detailed description for an agency using a pooled page"""
+        if not agency_detail_url:
+            print(f"No detail URL for agency {agency_name}, skipping")
+            return None
+
+        try:
+            # Try the static HTML first; only render pages without an intro
+            if self.detail_fetcher:
+                detail_desc = await self._in_thread(self.detail_fetcher.fetch_intro, agency_detail_url)
+                if detail_desc:
+                    return await self._in_thread(self._save_agency_detail, agency_id, detail_desc)
+                print(f"No intro in static HTML for {agency_name}, falling back to browser")
+
+            async with self.acquire_page() as page:
+                if not await self.navigate_to_url(page, agency_detail_url, retries=2):
+                    print(f"Failed to navigate to agency detail page: {agency_detail_url}")
+                    return None
+
+                # Wait once for any of the selectors, then pick the most specific match
+                try:
+                    with self.timings.stage('wait_detail'):
+                        await wait_for_detail_intro(page)
+                except Exception:
+                    print(f"No detail description selector appeared for {agency_name}")
+
+                with self.timings.stage('query_detail'):
+                    intro_elem = None
+                    for selector in DETAIL_INTRO_SELECTORS:
+                        intro_elem = await page.query_selector(selector)
+                        if intro_elem:
+                            break
+
+                if intro_elem:
+                    with self.timings.stage('extract_detail'):
+                        detail_desc = await intro_elem.inner_text()
+                else:
+                    body_text = await page.evaluate("""
+                        () => {
+                            const textContent = document.body.textContent;
+                            return textContent ? textContent.substring(0, 1000) : null;
+                        }
+                    """)
+                    if not body_text:
+                        print(f"No text content found for {agency_name}")
+                        return None
+                    detail_desc = re.sub(r'\s+', ' ', body_text).strip()
+
+            return await self._in_thread(self._save_agency_detail, agency_id, detail_desc)
+
+        except Exception as e:
+            print(f"Error in get_agency_detail for {agency_name}: {e}")
+            return None
+
+    async def _detail_worker(self, queue, progress):
+        """Pull agencies off the queue and scrape their detail pages"""
+        while True:
+            try:
+                agency = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            agency_id, agency_name, agency_idx, agency_detail_url = agency
+            try:
+                await self.get_agency_detail(agency_id, agency_name, agency_idx, agency_detail_url)
+            except Exception as e:
+                print(f"Error in detail worker for {agency_name}: {e}")
+            finally:
+                progress.update(1)
+
+    async def scrape_all_agency_details(self):
+        """Scrape detailed descriptions for all agencies with a pool of workers"""
+        print("\nStarting to scrape detailed agency descriptions...")
+
+        try:
+            agencies = await self._in_thread(self.db.get_agencies_without_details)
+
+            if not agencies:
+                print("No agencies found without detailed descriptions")
+                return
+
+            self.progress.set('details_total', len(agencies))
+
+            print(f"Found {self.progress.details_total} agencies needing detailed descriptions")
+
+            # Detail pages don't depend on each other, so one worker per pooled
+            # page processes them in parallel; the rate limiter adapts the
+            # request rate and the pages in flight to how the site responds
+            queue = asyncio.Queue()
+            for agency in agencies:
+                queue.put_nowait(agency)
+
+            with tqdm(total=len(agencies)) as progress:
+                await asyncio.gather(*(
+                    self._detail_worker(queue, progress)
+                    for _ in range(min(self.concurrency, len(agencies)))
+                ))
+
+            print(f"Completed scraping detailed descriptions for {self.progress.details_scraped}/{self.progress.details_total} agencies")
+
+        except Exception as e:
+            print(f"Error in scrape_all_agency_details: {e}")
+
+    async def _scrape_all(self):
+        """Scrape all categories concurrently, then their agency details"""
+        await self.start()
+
+        categories = await self.get_categories()
+
+        if not categories:
+            print("No categories found to scrape.")
+            self.progress.flush(status='failed')
+            return
+
+        categories = self.filter_categories(categories)
+
+        # Update expected total agencies
+        self.progress.set('agencies_total', sum(int(cat.get('agency_count', 0)) for cat in categories))
+
+        # Checkpoint the categories; a resumed run skips the finished ones
+        categories = self.pending_categories(categories)
+
+        # Every category borrows a page from the pool, so at most
+        # `concurrency` categories are being scraped at any time
+        await asyncio.gather(*(
+            self.get_agencies_in_category(cat['id'], cat['category_name'], cat['category_link'], cat.get('agency_count'))
+            for cat in categories
+        ))
+
+        if not self.skip_details:
+            await self.scrape_all_agency_details()
+        else:
+            print("Skipping detailed descriptions as requested")
+
+        await self._in_thread(
+            finish_session, self.db, self.progress, self.data_dir, self.export_formats, self.logo_downloader
+        )
+
+    async def _close_browser(self):
+        """Close the pooled pages, browser and Playwright driver"""
+        if self.context:
+            await self.context.close()
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+            print("Browser closed.")
+        self.context = self.browser = self.playwright = None
+
+    async def _run(self):
+        """Run the full scrape and always release the browser"""
+        try:
+            await self._scrape_all()
+        except Exception as e:
+            print(f"Error in scrape_all: {e}")
+            self.progress.flush(status='failed')
+        finally:
+            await self._close_browser()
+
+    def scrape_all(self):
+        """Scrape all categories, agencies, and their details"""
+        try:
+            asyncio.run(self._run())
+        finally:
+            self.close()
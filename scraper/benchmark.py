@@ -0,0 +1,148 @@
+"""End-to-end benchmark of the scraper against the local mock site
+
+Starts mock_site.py in-process, runs main.py against it once per engine
+mode in a fresh output directory, and reports wall time, pages/sec,
+agencies/sec, details/sec and the peak RSS of the scraper process tree
+(including its browsers):
+
+    python benchmark.py --categories 4 --agencies 100 --latency 0.05
+    python benchmark.py --modes sync async --json results.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from mock_site import MockSite, start_mock_site
+from metrics import process_tree_rss
+
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Extra main.py arguments of each engine mode
+MODES = {
+    "sync": ["--engine", "sync"],
+    "sync-http": ["--engine", "sync", "--fetch-mode", "http"],
+    "async": ["--engine", "async", "--concurrency", "4"],
+    "async-http": ["--engine", "async", "--concurrency", "4", "--fetch-mode", "http"],
+    "workers": ["--workers", "2"],
+}
+
+
+def run_mode(mode, base_url, site, timeout, extra_args):
+    """Run the scraper once in a mode and return its measurements"""
+    output_dir = tempfile.mkdtemp(prefix=f"iboss_bench_{mode}_")
+    category_names = [site.category_name(category) for category in range(site.categories)]
+    command = [
+        sys.executable, os.path.join(SCRAPER_DIR, "main.py"),
+        "--base-url", base_url, "--headless", "-n", "0", "-c", *category_names,
+        "--output-dir", output_dir, "--db-path", "bench.db", "--max-rps", "0",
+        *MODES[mode], *extra_args,
+    ]
+
+    before = dict(site.requests)
+    log_path = os.path.join(output_dir, "scraper.log")
+    started = time.monotonic()
+    peak_rss = 0
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, cwd=SCRAPER_DIR, stdout=log, stderr=subprocess.STDOUT)
+        while process.poll() is None:
+            peak_rss = max(peak_rss, process_tree_rss(process.pid))
+            if time.monotonic() - started > timeout:
+                process.kill()
+                break
+            time.sleep(0.2)
+        process.wait()
+    elapsed = time.monotonic() - started
+
+    pages = {kind: site.requests[kind] - before[kind] for kind in before}
+    agencies = details = 0
+    try:
+        conn = sqlite3.connect(os.path.join(output_dir, "bench.db"))
+        agencies, details = conn.execute("SELECT COUNT(*), COALESCE(SUM(detailed_scraped), 0) FROM agency").fetchone()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not read results of {mode}: {e}")
+
+    fetched = pages["directory"] + pages["listing"] + pages["detail"]
+    return {
+        "mode": mode,
+        "exit_code": process.returncode,
+        "seconds": round(elapsed, 2),
+        "pages": fetched,
+        "pages_per_sec": round(fetched / elapsed, 2),
+        "agencies": agencies,
+        "agencies_per_sec": round(agencies / elapsed, 2),
+        "details": details,
+        "details_per_sec": round(details / elapsed, 2),
+        "throttled": pages["throttled"],
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "log": log_path,
+    }
+
+
+def print_report(results):
+    columns = ["mode", "exit_code", "seconds", "pages_per_sec", "agencies", "agencies_per_sec",
+               "details", "details_per_sec", "throttled", "peak_rss_mb"]
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def parse_args(argv=None):
+    """Parse command line arguments for the benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark the scraper against the local mock site')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=["sync", "async"],
+                        help='Engine modes to run (default: sync async)')
+    parser.add_argument('--categories', type=int, default=3, help='Mock categories (default: 3)')
+    parser.add_argument('--agencies', type=int, default=60, help='Mock agencies per category (default: 60)')
+    parser.add_argument('--rows-per-page', type=int, default=20, help='Mock rows per listing page (default: 20)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock seconds per response (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Mock random +/- seconds (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Mock fraction of 429 responses (default: 0)')
+    parser.add_argument('--timeout', type=float, default=1800, help='Seconds before a run is killed (default: 1800)')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('scraper_args', nargs=argparse.REMAINDER,
+                        help='Extra main.py arguments for every run, after --')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    site = MockSite(
+        categories=args.categories,
+        agencies_per_category=args.agencies,
+        rows_per_page=args.rows_per_page,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate
+    )
+    server = start_mock_site(site)
+    extra_args = [arg for arg in args.scraper_args if arg != "--"]
+    print(f"Mock site on {server.base_url} with {args.categories} categories x {args.agencies} agencies")
+
+    results = []
+    try:
+        for mode in args.modes:
+            print(f"\nRunning {mode}...")
+            result = run_mode(mode, server.base_url, site, args.timeout, extra_args)
+            print(f"{mode}: {result['seconds']}s, {result['agencies']} agencies, {result['details']} details "
+                  f"(exit code {result['exit_code']}, log {result['log']})")
+            results.append(result)
+    finally:
+        server.shutdown()
+
+    print()
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logo_downloader import LogoDownloader
+from iboss_scraper import finish_session
+from workers import POLL_INTERVAL, Coordinator
+
+
+# Database writes a remote worker may send in a result batch
+RESULT_OPS = (
+    "insert_agencies_many",
+    "complete_page",
+    "mark_category_scraped",
+    "complete_category",
+    "mark_missing_agencies",
+    "update_agency_detail",
+    "complete_task",
+    "release_task",
+    "save_stage_timings",
+)
+
+
+class WorkerStats:
+    """Throughput of one remote worker as seen by the coordinator"""
+
+    def __init__(self):
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.tasks = 0
+        self.batches = 0
+        self.categories = 0
+        self.agencies = 0
+        self.details = 0
+
+        # Sequence number of the last result batch applied; a worker resends a
+        # batch it got no answer for, and the lock keeps a resend from racing
+        # the original
+        self.last_seq = 0
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        elapsed = max(self.last_seen - self.first_seen, 1.0)
+        return {
+            "tasks": self.tasks,
+            "batches": self.batches,
+            "categories": self.categories,
+            "agencies": self.agencies,
+            "details": self.details,
+            "agencies_per_minute": round(self.agencies * 60 / elapsed, 1),
+            "details_per_minute": round(self.details * 60 / elapsed, 1),
+            "seconds_since_last_seen": round(time.time() - self.last_seen, 1),
+        }
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the coordinator service"""
+
+    def do_GET(self):
+        coordinator = self.server.coordinator
+        if self.path == "/session":
+            self._send(coordinator.session_info())
+        elif self.path == "/status":
+            self._send(coordinator.status())
+        else:
+            self._send({"error": f"Unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        routes = {
+            "/claim": coordinator.handle_claim,
+            "/open": coordinator.handle_open,
+            "/results": coordinator.handle_results,
+            "/heartbeat": coordinator.handle_heartbeat,
+        }
+        if self.path not in routes:
+            self._send({"error": f"Unknown path {self.path}"}, 404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            self._send(routes[self.path](payload))
+        except Exception as e:
+            print(f"Error handling {self.path}: {e}")
+            self._send({"error": str(e)}, 500)
+
+    def _send(self, body, status=200):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Workers poll constantly; the per-request log would drown the crawl output
+        pass
+
+
+class CoordinatorService(Coordinator):
+    """HTTP/JSON service that hands out tasks to workers on other hosts
+
+    The coordinator owns the canonical database. Workers claim category and
+    detail tasks over HTTP, send their database writes back in batches with
+    their next request, and never touch the SQLite file. Logos are
+    downloaded here from the URLs in the stored listing rows, so workers
+    need no shared filesystem. GET /status reports progress and each
+    worker's throughput.
+    """
+
+    def __init__(self, host, port, scraper_kwargs, lease_seconds=300, max_attempts=3):
+        super().__init__(1, scraper_kwargs, lease_seconds, max_attempts)
+        self.address = (host, port)
+        self.refresh = self.scraper_kwargs.get('refresh', False)
+        self.max_agencies_per_category = self.scraper_kwargs.get('max_agencies_per_category', 0)
+        self.logo_workers = self.scraper_kwargs.get('logo_workers', 4)
+
+        self.server = None
+        self.logo_downloader = None
+        self.worker_stats = {}
+        self.stats_lock = threading.Lock()
+        self.details_queued = False
+        self.details_lock = threading.Lock()
+
+    def session_info(self):
+        """Settings a worker needs to join the session"""
+        return {
+            "session_id": self.session_id,
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "max_agencies_per_category": self.max_agencies_per_category,
+            "refresh": self.refresh,
+            "skip_details": self.skip_details,
+        }
+
+    def status(self):
+        """Session progress, open tasks and per-worker throughput"""
+        with self.stats_lock:
+            workers = {name: stats.to_dict() for name, stats in self.worker_stats.items()}
+        return {
+            "session_id": self.session_id,
+            "progress": self.db.get_scraping_status(self.session_id),
+            "open_tasks": {
+                task_type: self.db.count_open_tasks(self.session_id, task_type, self.max_attempts)
+                for task_type in ("category", "detail")
+            },
+            "workers": workers,
+        }
+
+    def _stats(self, worker):
+        with self.stats_lock:
+            if worker not in self.worker_stats:
+                print(f"Worker {worker} joined")
+                self.worker_stats[worker] = WorkerStats()
+            stats = self.worker_stats[worker]
+            stats.last_seen = time.time()
+            return stats
+
+    def apply_results(self, worker, results, seq=None):
+        """Apply a batch of database writes sent by a worker, in order, once per batch seq"""
+        stats = self._stats(worker)
+        with stats.lock:
+            if seq is not None:
+                if seq <= stats.last_seq:
+                    print(f"Skipping batch {seq} of worker {worker}, already applied")
+                    return
+            self._apply_ops(worker, stats, results)
+            if seq is not None:
+                stats.last_seq = seq
+
+    def _apply_ops(self, worker, stats, results):
+        for result in results or []:
+            op = result.get("op")
+            args = result.get("args", {})
+            if op not in RESULT_OPS:
+                raise ValueError(f"Unknown result op {op}")
+
+            if op == "insert_agencies_many":
+                agencies = args["agencies"]
+                agency_ids = self.db.insert_agencies_many(
+                    args["category_id"], args["category_name"], agencies,
+                    session_id=self.session_id, refresh=self.refresh
+                )
+                for agency, agency_id in zip(agencies, agency_ids):
+                    self.logo_downloader.submit(agency_id, agency.get('agency_logo'), agency.get('agency_name'))
+                self.progress.increment('agencies_scraped', len(agency_ids))
+                stats.agencies += len(agency_ids)
+            elif op == "complete_page":
+                self.db.complete_page(self.session_id, args["category_id"], args["page"])
+            elif op == "mark_category_scraped":
+                self.db.mark_category_scraped(args["category_id"])
+                self.progress.increment('categories_scraped')
+                stats.categories += 1
+            elif op == "complete_category":
+                self.db.complete_category(self.session_id, args["category_id"])
+            elif op == "mark_missing_agencies":
+                if self.refresh:
+                    removed = self.db.mark_missing_agencies(args["category_id"], self.session_id)
+                    if removed:
+                        print(f"Marked {removed} agencies as removed from category {args['category_id']}")
+            elif op == "update_agency_detail":
+                self.db.update_agency_detail(args["agency_id"], args["detail_desc"])
+                self.progress.increment('details_scraped')
+                stats.details += 1
+            elif op == "complete_task":
+                self.db.complete_task(self.session_id, args["task_key"])
+            elif op == "release_task":
+                self.db.release_task(self.session_id, args["task_key"], worker)
+            elif op == "save_stage_timings":
+                self.db.save_stage_timings(self.session_id, args["rows"])
+
+        if results:
+            stats.batches += 1
+
+    def _detail_phase_ready(self):
+        """Queue the detail tasks once every category is done; returns False until then"""
+        if self.db.count_open_tasks(self.session_id, 'category', self.max_attempts):
+            return False
+        with self.details_lock:
+            if not self.details_queued:
+                self.queue_details()
+                self.details_queued = True
+        return True
+
+    def handle_claim(self, payload):
+        worker = payload["worker"]
+        task_type = payload["task_type"]
+        self.apply_results(worker, payload.get("results"), payload.get("seq"))
+
+        if task_type == 'detail' and (self.skip_details or not self._detail_phase_ready()):
+            return {"task": None}
+
+        task = self.db.claim_task(self.session_id, task_type, worker, self.lease_seconds, self.max_attempts)
+        if not task:
+            return {"task": None}
+
+        self._stats(worker).tasks += 1
+        if task_type == 'category':
+            task["category"] = self.db.get_category_by_id(task["category_id"])
+            task["done_pages"] = sorted(self.db.get_done_pages(self.session_id, task["category_id"]))
+        else:
+            task["agency"] = self.db.get_agency_by_id(task["agency_id"])
+        return {"task": task}
+
+    def handle_open(self, payload):
+        worker = payload["worker"]
+        task_type = payload["task_type"]
+        self.apply_results(worker, payload.get("results"), payload.get("seq"))
+
+        if task_type == 'detail':
+            if self.skip_details:
+                return {"open": 0}
+            if not self._detail_phase_ready():
+                return {"open": self.db.count_open_tasks(self.session_id, 'category', self.max_attempts)}
+        return {"open": self.db.count_open_tasks(self.session_id, task_type, self.max_attempts)}
+
+    def handle_results(self, payload):
+        results = payload.get("results") or []
+        self.apply_results(payload["worker"], results, payload.get("seq"))
+        return {"applied": len(results)}
+
+    def handle_heartbeat(self, payload):
+        self._stats(payload["worker"])
+        self.db.extend_lease(self.session_id, payload["task_key"], payload["worker"], self.lease_seconds)
+        return {"ok": True}
+
+    def finished(self):
+        """True once every task of the session is done or out of attempts"""
+        if self.skip_details:
+            return self.db.count_open_tasks(self.session_id, 'category', self.max_attempts) == 0
+        if not self._detail_phase_ready():
+            return False
+        return self.db.count_open_tasks(self.session_id, 'detail', self.max_attempts) == 0
+
+    def scrape_all(self):
+        """Serve tasks to remote workers until the session is finished, then export"""
+        try:
+            if not self.open_session():
+                return
+
+            self.logo_downloader = LogoDownloader(
+                self.db, os.path.join(self.data_dir, "logos"), workers=self.logo_workers, timings=self.timings
+            )
+
+            self.server = ThreadingHTTPServer(self.address, CoordinatorHandler)
+            self.server.daemon_threads = True
+            self.server.coordinator = self
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"Coordinator for session {self.session_id} listening on http://{self.address[0]}:{self.address[1]}")
+
+            while not self.finished():
+                time.sleep(POLL_INTERVAL)
+
+            self.server.shutdown()
+            self.print_worker_summary()
+
+            finish_session(self.db, self.progress, self.data_dir, self.export_formats, self.logo_downloader)
+
+        except Exception as e:
+            print(f"Error in scrape_all: {e}")
+            if self.progress:
+                self.progress.flush(status='failed')
+
+        finally:
+            self.close()
+
+    def print_worker_summary(self):
+        """Print the throughput of every worker that took part"""
+        with self.stats_lock:
+            workers = {name: stats.to_dict() for name, stats in self.worker_stats.items()}
+        for name, stats in sorted(workers.items()):
+            print(f"Worker {name}: {stats['tasks']} tasks, {stats['categories']} categories, "
+                  f"{stats['agencies']} agencies ({stats['agencies_per_minute']}/min), "
+                  f"{stats['details']} details ({stats['details_per_minute']}/min)")
+
+    def close(self):
+        """Stop serving, finish logo downloads and close the database"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.logo_downloader:
+            self.logo_downloader.close()
+            self.logo_downloader = None
+        super().close()
@@ -0,0 +1,85 @@
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html
+from instrumentation import StageTimings
+
+
+# XPath equivalents of the browser's div.intro selectors, most specific first
+INTRO_XPATHS = [
+    "//*[@id='_RST_dir']/div/div[contains(concat(' ', normalize-space(@class), ' '), ' cont_main ')]"
+    "/div/div/div[2]/div[contains(concat(' ', normalize-space(@class), ' '), ' intro ')]",
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' intro ')]",
+    "//div[contains(@class, 'intro')]",
+]
+
+
+class DetailFetcher:
+    """Fetch agency detail pages over plain HTTP instead of rendering them in a browser"""
+
+    def __init__(self, pool_size=10, timeout=10, rate_limiter=None, timings=None):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.timings = timings or StageTimings()
+        self.session = requests.Session()
+
+        # Keep-alive connections are reused across detail pages; requests
+        # already negotiates and decodes gzip/deflate transparently
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            ),
+            "Accept": "text/html,application/xhtml+xml",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def extract_intro(self, page_html):
+        """Extract the div.intro text from a detail page, or None if the static HTML has none"""
+        try:
+            tree = html.fromstring(page_html)
+        except Exception as e:
+            print(f"Error parsing detail page HTML: {e}")
+            return None
+
+        for xpath in INTRO_XPATHS:
+            matches = tree.xpath(xpath)
+            if not matches:
+                continue
+
+            intro = matches[0]
+            # Keep line breaks the way the browser's innerText would
+            for br in intro.iter("br"):
+                br.tail = "\n" + (br.tail or "")
+            lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in intro.text_content().split("\n"))
+            text = "\n".join(line for line in lines if line)
+            if text:
+                return text
+
+        return None
+
+    def fetch_intro(self, url):
+        """Fetch a detail page and return its intro text, or None to fall back to the browser"""
+        try:
+            if self.rate_limiter:
+                with self.rate_limiter.request(url) as request, self.timings.stage('http_fetch'):
+                    response = self.session.get(url, timeout=self.timeout)
+                    request.record(response.status_code, response.headers.get("Retry-After"))
+            else:
+                with self.timings.stage('http_fetch'):
+                    response = self.session.get(url, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"HTTP fetch of {url} returned status {response.status_code}")
+                return None
+            with self.timings.stage('parse_detail'):
+                return self.extract_intro(response.content)
+        except Exception as e:
+            print(f"Error fetching {url} over HTTP: {e}")
+            return None
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
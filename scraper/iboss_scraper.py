@@ -1,30 +1,250 @@
 import time
 import os
 import re
-import pandas as pd
+import json
+import hashlib
+import shutil
+import csv
 import sqlite3
 from datetime import datetime
 from playwright.sync_api import sync_playwright
 from tqdm import tqdm
 import threading
-import requests
+import queue
 from urllib.parse import urlparse
 from pathlib import Path
+from http_fetcher import DetailFetcher
+from logo_downloader import LogoDownloader
+from progress import ProgressTracker
+from instrumentation import StageTimings
+from rate_limiter import AdaptiveRateLimiter
+from resource_filter import DEFAULT_BLOCKED_RESOURCE_TYPES, ResourceFilter
+from pagination import (
+    PAGINATION_LINKS_JS, PAGINATION_SELECTORS, build_page_url,
+    estimate_page_count, learn_page_url_scheme
+)
+from waits import (
+    DETAIL_INTRO_SELECTORS, listing_signature, wait_for_detail_intro,
+    wait_for_listing_change, wait_for_listing_rows
+)
+
+
+# The live site; --base-url points the scraper elsewhere (e.g. the mock site)
+DEFAULT_BASE_URL = "https://www.i-boss.co.kr"
+
+# Tables and views exported to [name].csv / [name].parquet, with what their rows are
+EXPORT_TABLES = [
+    ("categories", "categories"),
+    ("agencies", "agencies"),
+    ("scraping_status", "scraping sessions"),
+]
+
+# Parquet exports written as a directory with one hive-style subdirectory per value of this column
+PARQUET_PARTITIONS = {"agencies": "category_name"}
+
+# Rows fetched per round-trip while exporting; memory use does not grow with table size
+EXPORT_CHUNK_ROWS = 1000
+
+# Extracts every agency row of a listing page in one page.evaluate call.
+# Each field keeps the selector fallback chain of the original per-row
+# queries; rows without a name come back as null.
+AGENCY_LIST_JS = """
+() => {
+    const first = (root, selectors) => {
+        for (const selector of selectors) {
+            const found = root.querySelector(selector);
+            if (found) return found;
+        }
+        return null;
+    };
+
+    let rows = document.querySelectorAll("div._list > div");
+    if (!rows.length) {
+        rows = document.querySelectorAll("div.conts div[class^='list_'] > div");
+    }
+
+    return Array.from(rows, row => {
+        const nameElem = first(row, [
+            "a.link_tit > span.AB-LF-common", "a > span[class*='AB-']",
+            "a[class*='link_'] > span", "a > span"
+        ]);
+        if (!nameElem) return null;
+
+        const linkElem = first(row, ["a.link_tit", "a[href*='idx=']"]) || nameElem.closest('a');
+        const urlElem = first(row, [
+            "div.url > a.link_tit", "div.url > a",
+            "div[class*='url'] > a", "a[class*='link_url']"
+        ]);
+        const logoElem = first(row, [
+            "div.logo_thumb > a > img", "div[class*='logo'] > a > img",
+            "div[class*='logo'] img", "img[class*='logo']", "img"
+        ]);
+        const descElem = first(row, [
+            "p.desc", "p[class*='desc']", "p", "div[class*='desc']"
+        ]);
+
+        return {
+            name: nameElem.innerText,
+            href: linkElem ? linkElem.getAttribute('href') : null,
+            url: urlElem ? urlElem.innerText : null,
+            logo: logoElem ? logoElem.getAttribute('src') : null,
+            desc: descElem ? descElem.innerText : null
+        };
+    });
+}
+"""
+
+
+class _WriteRequest:
+    """A unit of work for the writer thread and, optionally, its result"""
+    
+    def __init__(self, func, wait):
+        self.func = func
+        self.done = threading.Event() if wait else None
+        self.result = None
+        self.error = None
 
 
 class Database:
-    """SQLite database manager for storing scraping results"""
+    """SQLite database manager for storing scraping results
     
-    def __init__(self, db_path="iboss_data/iboss_scraper.db"):
+    The database runs in WAL mode so readers never block the scraper. All
+    writes go through a single writer thread that drains a queue and commits
+    many writes in one transaction; reads use a separate connection.
+    """
+    
+    # Bumped whenever _migrate() learns a new step
+    SCHEMA_VERSION = 4
+    
+    def __init__(self, db_path="iboss_data/iboss_scraper.db", batch_size=500, timings=None):
         """Initialize the database connection"""
+        # Commit latency of the writer thread is recorded as the db_commit stage
+        self.timings = timings or StageTimings()
+        
         # Ensure directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
         
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.lock = threading.Lock()  # Lock for thread safety
+        self._configure_connection(self.conn)
+        self.lock = threading.Lock()  # Guards the reader connection
         self.cursor = self.conn.cursor()
         self._create_tables()
+        
+        # Writer thread state; the thread starts on the first write
+        self.batch_size = batch_size
+        self.write_queue = queue.Queue()
+        self.writer_thread = None
+        self.writer_lock = threading.Lock()
+        self.unconfirmed_writes = 0
+    
+    def _configure_connection(self, conn):
+        """Enable WAL so readers and the writer don't block each other"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+    
+    def _start_writer(self):
+        """Start the writer thread if it isn't running yet"""
+        with self.writer_lock:
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+                self.writer_thread.start()
+    
+    def _writer_loop(self):
+        """Drain the write queue, committing each batch in a single transaction"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self._configure_connection(conn)
+        cursor = conn.cursor()
+        
+        running = True
+        while running:
+            request = self.write_queue.get()
+            if request is None:
+                break
+            
+            batch = [request]
+            while len(batch) < self.batch_size:
+                try:
+                    request = self.write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                batch.append(request)
+            
+            started = time.perf_counter()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for request in batch:
+                    # A savepoint per write keeps one failing write from undoing the batch
+                    cursor.execute("SAVEPOINT write_request")
+                    try:
+                        request.result = request.func(cursor)
+                        cursor.execute("RELEASE write_request")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO write_request")
+                        cursor.execute("RELEASE write_request")
+                        request.error = e
+                cursor.execute("COMMIT")
+            except Exception as e:
+                print(f"Error committing database writes: {e}")
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                for request in batch:
+                    request.error = request.error or e
+            self.timings.record('db_commit', time.perf_counter() - started)
+            
+            for request in batch:
+                if request.done:
+                    request.done.set()
+                else:
+                    if request.error:
+                        print(f"Error in queued database write: {request.error}")
+                    with self.writer_lock:
+                        self.unconfirmed_writes -= 1
+        
+        conn.close()
+    
+    def _write(self, func, wait=True):
+        """Run func(cursor) on the writer thread
+        
+        With wait=True the call blocks until the batch holding the write has
+        committed and returns func's result. With wait=False the write is
+        queued and the call returns at once.
+        """
+        self._start_writer()
+        request = _WriteRequest(func, wait)
+        if not wait:
+            with self.writer_lock:
+                self.unconfirmed_writes += 1
+        self.write_queue.put(request)
+        
+        if wait:
+            request.done.wait()
+            if request.error:
+                raise request.error
+            return request.result
+    
+    def _execute_write(self, query, params=(), wait=False):
+        """Queue a single statement for the writer thread"""
+        return self._write(lambda cursor: cursor.execute(query, params).rowcount, wait=wait)
+    
+    def _execute_many_write(self, query, rows, wait=False):
+        """Queue one statement run over many parameter rows"""
+        return self._write(lambda cursor: cursor.executemany(query, rows).rowcount, wait=wait)
+    
+    def flush(self):
+        """Wait until every queued write has been committed"""
+        if self.writer_thread is not None:
+            self._write(lambda cursor: None)
+    
+    def _sync_reads(self):
+        """Make sure reads see writes queued without waiting"""
+        if self.unconfirmed_writes:
+            self.flush()
     
     def _create_tables(self):
         """Create tables for storing scraping data"""
@@ -41,12 +261,11 @@ class Database:
             )
             ''')
             
-            # Agencies table
+            # Agency table: one row per agency, however many categories list it
             self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS agencies (
+            CREATE TABLE IF NOT EXISTS agency (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category_id INTEGER,
-                category_name TEXT NOT NULL,
+                agency_key TEXT NOT NULL UNIQUE,
                 agency_name TEXT NOT NULL,
                 agency_url TEXT,
                 agency_logo TEXT,
@@ -56,10 +275,27 @@ class Database:
                 agency_detail_url TEXT,
                 agency_detail_desc TEXT,
                 detailed_scraped BOOLEAN DEFAULT 0,
+                listing_hash TEXT,
+                detail_hash TEXT,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_agency_detailed_scraped ON agency (detailed_scraped)")
+            
+            # Category membership of each agency
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agency_category (
+                agency_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                last_seen_session INTEGER,
+                removed BOOLEAN DEFAULT 0,
                 last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (agency_id, category_id),
+                FOREIGN KEY (agency_id) REFERENCES agency (id),
                 FOREIGN KEY (category_id) REFERENCES categories (id)
             )
             ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_agency_category_category ON agency_category (category_id)")
             
             # Scraping_status table for tracking progress
             self.cursor.execute('''
@@ -77,101 +313,318 @@ class Database:
             )
             ''')
             
+            # Checkpoints of a session: one task per category and per listing page
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS work_queue (
+                session_id INTEGER NOT NULL,
+                task_key TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                category_id INTEGER,
+                page INTEGER,
+                agency_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (session_id, task_key)
+            )
+            ''')
+            
+            # Per-session latency of each scraping stage (see instrumentation.py)
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stage_timings (
+                session_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                count INTEGER,
+                total_seconds REAL,
+                p50_seconds REAL,
+                p95_seconds REAL,
+                p99_seconds REAL,
+                max_seconds REAL,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (session_id, stage)
+            )
+            ''')
+            
+            # Content-addressed logo store: one row per distinct logo URL
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS logos (
+                logo_url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                image_type TEXT,
+                size INTEGER,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
             self.conn.commit()
+            self._migrate()
     
-    def insert_category(self, category_name, category_link, agency_count):
-        """Insert a category into the database"""
-        with self.lock:
-            # Check if category already exists
-            self.cursor.execute(
-                "SELECT id FROM categories WHERE category_name = ?", 
-                (category_name,)
-            )
-            existing = self.cursor.fetchone()
+    def _migrate(self):
+        """Bring an existing database up to SCHEMA_VERSION"""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
             
-            if existing:
-                # Update existing category
-                self.cursor.execute(
-                    "UPDATE categories SET category_link = ?, agency_count = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
-                    (category_link, agency_count, existing[0])
-                )
-                category_id = existing[0]
-            else:
-                # Insert new category
-                self.cursor.execute(
-                    "INSERT INTO categories (category_name, category_link, agency_count, last_updated) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
-                    (category_name, category_link, agency_count)
+            # Databases before schema version 2 keep one agencies row per (category, agency)
+            legacy_agencies = self.cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agencies'"
+            ).fetchone() is not None
+            
+            if version < 1:
+                # Databases created before the unique keys may hold duplicates; merge them first
+                if legacy_agencies:
+                    self.cursor.execute('''
+                    UPDATE agencies SET category_id = (
+                        SELECT MIN(c2.id) FROM categories c1
+                        JOIN categories c2 ON c2.category_name = c1.category_name
+                        WHERE c1.id = agencies.category_id
+                    )
+                    WHERE category_id IN (SELECT id FROM categories)
+                    ''')
+                self.cursor.execute('''
+                DELETE FROM categories WHERE id NOT IN (
+                    SELECT MIN(id) FROM categories GROUP BY category_name
                 )
-                category_id = self.cursor.lastrowid
+                ''')
+                self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_name ON categories (category_name)")
             
+            if version < 2:
+                if legacy_agencies:
+                    # Collapse per-category rows into one agency each; the row that
+                    # already has its details wins, then the most recently updated
+                    self.cursor.execute('''
+                    INSERT OR IGNORE INTO agency (agency_key, agency_name, agency_url, agency_logo, local_logo_path,
+                                                  agency_desc, agency_idx, agency_detail_url, agency_detail_desc,
+                                                  detailed_scraped, last_updated)
+                    SELECT COALESCE(NULLIF(agency_idx, ''), 'name:' || agency_name), agency_name, agency_url, agency_logo,
+                           local_logo_path, agency_desc, agency_idx, agency_detail_url, agency_detail_desc,
+                           detailed_scraped, last_updated
+                    FROM agencies
+                    ORDER BY detailed_scraped DESC, last_updated DESC, id DESC
+                    ''')
+                    self.cursor.execute('''
+                    INSERT OR IGNORE INTO agency_category (agency_id, category_id, last_updated)
+                    SELECT a.id, l.category_id, l.last_updated
+                    FROM agencies l
+                    JOIN agency a ON a.agency_key = COALESCE(NULLIF(l.agency_idx, ''), 'name:' || l.agency_name)
+                    WHERE l.category_id IS NOT NULL
+                    ''')
+                    self.cursor.execute("DROP TABLE agencies")
+            
+            if version < 3:
+                # Fingerprints and last-seen tracking for --refresh
+                self._add_column("agency", "listing_hash", "TEXT")
+                self._add_column("agency", "detail_hash", "TEXT")
+                self._add_column("agency_category", "last_seen_session", "INTEGER")
+                self._add_column("agency_category", "removed", "BOOLEAN DEFAULT 0")
+                
+                # The old per-category shape stays readable as a view of current memberships
+                self.cursor.execute("DROP VIEW IF EXISTS agencies")
+                self.cursor.execute('''
+                CREATE VIEW agencies AS
+                SELECT a.id, ac.category_id, c.category_name, a.agency_name, a.agency_url, a.agency_logo,
+                       a.local_logo_path, a.agency_desc, a.agency_idx, a.agency_detail_url, a.agency_detail_desc,
+                       a.detailed_scraped, a.last_updated
+                FROM agency_category ac
+                JOIN agency a ON a.id = ac.agency_id
+                LEFT JOIN categories c ON c.id = ac.category_id
+                WHERE ac.removed = 0
+                ''')
+            
+            if version < 4:
+                # Leases for worker processes sharing the work queue
+                self._add_column("work_queue", "agency_id", "INTEGER")
+                self._add_column("work_queue", "lease_owner", "TEXT")
+                self._add_column("work_queue", "lease_expires", "REAL")
+                self._add_column("work_queue", "attempts", "INTEGER DEFAULT 0")
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_work_queue_claim ON work_queue (session_id, task_type, status)")
+            
+            self.cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
             self.conn.commit()
-            return category_id
+            if version:
+                print(f"Migrated database from schema version {version} to {self.SCHEMA_VERSION}")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error migrating database: {e}")
+            raise
+    
+    def _add_column(self, table, column, definition):
+        """Add a column unless the table already has it"""
+        columns = [row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def insert_category(self, category_name, category_link, agency_count):
+        """Insert a category into the database"""
+        def write(cursor):
+            # Insert or update in one statement, keyed on the unique category name
+            cursor.execute(
+                "INSERT INTO categories (category_name, category_link, agency_count, last_updated) VALUES (?, ?, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (category_name) DO UPDATE SET category_link = excluded.category_link, agency_count = excluded.agency_count, last_updated = CURRENT_TIMESTAMP "
+                "RETURNING id",
+                (category_name, category_link, agency_count)
+            )
+            return cursor.fetchone()[0]
+        
+        return self._write(write)
+    
+    @staticmethod
+    def agency_key(agency_idx, agency_name):
+        """Identity of an agency across categories: its idx, or its name when the idx is unknown"""
+        return agency_idx if agency_idx else f"name:{agency_name}"
+    
+    @staticmethod
+    def listing_hash(agency):
+        """Fingerprint of what the listing page shows for an agency"""
+        fields = [agency.get(name) for name in ('agency_name', 'agency_url', 'agency_logo', 'agency_desc', 'agency_idx')]
+        return hashlib.sha1(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
     
     def insert_agency(self, category_id, category_name, agency_name, agency_url, agency_logo, agency_desc, agency_idx=None, agency_detail_url=None, local_logo_path=None):
-        """Insert an agency into the database"""
-        with self.lock:
-            # Check if agency already exists for this category
-            self.cursor.execute(
-                "SELECT id FROM agencies WHERE category_id = ? AND agency_name = ?", 
-                (category_id, agency_name)
+        """Insert an agency into the database and link it to a category"""
+        return self.insert_agencies_many(category_id, category_name, [{
+            'agency_name': agency_name,
+            'agency_url': agency_url,
+            'agency_logo': agency_logo,
+            'agency_desc': agency_desc,
+            'agency_idx': agency_idx,
+            'agency_detail_url': agency_detail_url,
+            'local_logo_path': local_logo_path,
+        }])[0]
+    
+    def insert_agencies_many(self, category_id, category_name, agencies, session_id=None, refresh=False):
+        """Upsert a whole listing page of agencies in one transaction
+        
+        agencies is a list of records as built by IBossScraper.build_agency_record.
+        Each agency is stored once (keyed by agency_key) and linked to the
+        category; category_name is read from the categories table. The
+        membership is stamped with session_id. With refresh=True, agencies
+        whose listing fingerprint changed need their details fetched again.
+        Returns the agency ids in the same order.
+        """
+        if not agencies:
+            return []
+        
+        keys = [self.agency_key(agency.get('agency_idx'), agency['agency_name']) for agency in agencies]
+        rows = [
+            (key, agency['agency_name'], agency.get('agency_url'), agency.get('agency_logo'), agency.get('local_logo_path'),
+             agency.get('agency_desc'), agency.get('agency_idx'), agency.get('agency_detail_url'), self.listing_hash(agency),
+             int(refresh))
+            for key, agency in zip(keys, agencies)
+        ]
+        
+        def write(cursor):
+            # Rows stored before fingerprints existed (listing_hash NULL) count as unchanged
+            cursor.executemany(
+                "INSERT INTO agency (agency_key, agency_name, agency_url, agency_logo, local_logo_path, agency_desc, agency_idx, agency_detail_url, listing_hash, last_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (agency_key) DO UPDATE SET agency_name = excluded.agency_name, agency_url = excluded.agency_url, agency_logo = excluded.agency_logo, "
+                "local_logo_path = COALESCE(excluded.local_logo_path, local_logo_path), agency_desc = excluded.agency_desc, "
+                "agency_idx = excluded.agency_idx, agency_detail_url = excluded.agency_detail_url, "
+                "detailed_scraped = CASE WHEN ? AND listing_hash IS NOT NULL AND listing_hash <> excluded.listing_hash THEN 0 ELSE detailed_scraped END, "
+                "listing_hash = excluded.listing_hash, last_updated = CURRENT_TIMESTAMP",
+                rows
             )
-            existing = self.cursor.fetchone()
             
-            if existing:
-                # Update existing agency
-                self.cursor.execute(
-                    "UPDATE agencies SET agency_url = ?, agency_logo = ?, local_logo_path = ?, agency_desc = ?, agency_idx = ?, agency_detail_url = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
-                    (agency_url, agency_logo, local_logo_path, agency_desc, agency_idx, agency_detail_url, existing[0])
-                )
-                agency_id = existing[0]
-            else:
-                # Insert new agency
-                self.cursor.execute(
-                    "INSERT INTO agencies (category_id, category_name, agency_name, agency_url, agency_logo, local_logo_path, agency_desc, agency_idx, agency_detail_url, last_updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
-                    (category_id, category_name, agency_name, agency_url, agency_logo, local_logo_path, agency_desc, agency_idx, agency_detail_url)
-                )
-                agency_id = self.cursor.lastrowid
+            # executemany can't return rows, so look the ids up through the unique key
+            unique_keys = list(set(keys))
+            placeholders = ", ".join("?" * len(unique_keys))
+            cursor.execute(
+                f"SELECT agency_key, id FROM agency WHERE agency_key IN ({placeholders})",
+                unique_keys
+            )
+            ids = dict(cursor.fetchall())
             
-            self.conn.commit()
-            return agency_id
+            cursor.executemany(
+                "INSERT INTO agency_category (agency_id, category_id, last_seen_session, removed, last_updated) VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (agency_id, category_id) DO UPDATE SET last_seen_session = excluded.last_seen_session, removed = 0, last_updated = CURRENT_TIMESTAMP",
+                [(ids[key], category_id, session_id) for key in unique_keys]
+            )
+            return [ids[key] for key in keys]
+        
+        return self._write(write)
     
     def update_agency_detail(self, agency_id, detail_desc):
         """Update agency with detailed description"""
+        detail_hash = hashlib.sha1((detail_desc or "").encode('utf-8')).hexdigest()
+        # last_updated only moves when the description actually changed
+        self._execute_write(
+            "UPDATE agency SET agency_detail_desc = ?, detailed_scraped = 1, "
+            "last_updated = CASE WHEN detail_hash IS ? THEN last_updated ELSE CURRENT_TIMESTAMP END, detail_hash = ? WHERE id = ?",
+            (detail_desc, detail_hash, detail_hash, agency_id)
+        )
+    
+    def update_agency_logo_path(self, agency_id, local_logo_path):
+        """Record where an agency's logo was saved"""
+        self._execute_write(
+            "UPDATE agency SET local_logo_path = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
+            (local_logo_path, agency_id)
+        )
+    
+    def insert_logo(self, logo_url, content_hash, local_path, image_type, size):
+        """Map a logo URL to the content-addressed file it was stored in"""
+        self._execute_write(
+            "INSERT OR REPLACE INTO logos (logo_url, content_hash, local_path, image_type, size, last_updated) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (logo_url, content_hash, local_path, image_type, size)
+        )
+    
+    def get_logo_path(self, logo_url):
+        """Get the local path of a previously downloaded logo URL"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
-                "UPDATE agencies SET agency_detail_desc = ?, detailed_scraped = 1, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
-                (detail_desc, agency_id)
+                "SELECT local_path FROM logos WHERE logo_url = ?",
+                (logo_url,)
             )
-            self.conn.commit()
+            row = self.cursor.fetchone()
+            return row[0] if row else None
     
     def get_agency_by_id(self, agency_id):
         """Get agency by its ID"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
-                "SELECT id, agency_name, agency_idx, agency_detail_url FROM agencies WHERE id = ?",
+                "SELECT id, agency_name, agency_idx, agency_detail_url FROM agency WHERE id = ?",
                 (agency_id,)
             )
             return self.cursor.fetchone()
     
     def get_agencies_without_details(self):
-        """Get agencies that don't have detailed descriptions yet"""
+        """Get agencies that don't have detailed descriptions yet (each agency once, whatever its categories)"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
-                "SELECT id, agency_name, agency_idx, agency_detail_url FROM agencies WHERE detailed_scraped = 0"
+                "SELECT id, agency_name, agency_idx, agency_detail_url FROM agency WHERE detailed_scraped = 0"
             )
             return self.cursor.fetchall()
     
     def mark_category_scraped(self, category_id):
         """Mark a category as scraped"""
-        with self.lock:
-            self.cursor.execute(
-                "UPDATE categories SET scraped = 1, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
-                (category_id,)
-            )
-            self.conn.commit()
+        self._execute_write(
+            "UPDATE categories SET scraped = 1, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
+            (category_id,)
+        )
+    
+    def mark_missing_agencies(self, category_id, session_id):
+        """Flag agencies of a category that were not seen in this session as removed
+        
+        Returns the number of memberships newly flagged.
+        """
+        return self._execute_write(
+            "UPDATE agency_category SET removed = 1, last_updated = CURRENT_TIMESTAMP "
+            "WHERE category_id = ? AND removed = 0 AND (last_seen_session IS NULL OR last_seen_session <> ?)",
+            (category_id, session_id),
+            wait=True
+        )
     
     def get_unscraped_categories(self):
         """Get all categories that haven't been scraped yet"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
                 "SELECT id, category_name, category_link, agency_count FROM categories WHERE scraped = 0"
@@ -180,14 +633,26 @@ class Database:
     
     def get_categories(self):
         """Get all categories"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
                 "SELECT id, category_name, category_link, agency_count, scraped FROM categories"
             )
             return self.cursor.fetchall()
     
+    def get_category_by_id(self, category_id):
+        """Get a category by its ID"""
+        self._sync_reads()
+        with self.lock:
+            self.cursor.execute(
+                "SELECT id, category_name, category_link, agency_count FROM categories WHERE id = ?",
+                (category_id,)
+            )
+            return self.cursor.fetchone()
+    
     def get_agencies_by_category(self, category_id):
         """Get all agencies for a specific category"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
                 "SELECT agency_name, agency_url, agency_logo, agency_desc, agency_detail_desc FROM agencies WHERE category_id = ?",
@@ -197,6 +662,7 @@ class Database:
     
     def get_all_agencies(self):
         """Get all agencies"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
                 "SELECT category_name, agency_name, agency_url, agency_logo, agency_desc, agency_detail_desc FROM agencies"
@@ -204,144 +670,435 @@ class Database:
             return self.cursor.fetchall()
     
     def count_agencies(self):
-        """Count total number of agencies"""
+        """Count distinct agencies"""
+        self._sync_reads()
         with self.lock:
-            self.cursor.execute("SELECT COUNT(*) FROM agencies")
+            self.cursor.execute("SELECT COUNT(*) FROM agency")
             return self.cursor.fetchone()[0]
     
     def count_agencies_with_details(self):
         """Count agencies with detailed descriptions"""
+        self._sync_reads()
         with self.lock:
-            self.cursor.execute("SELECT COUNT(*) FROM agencies WHERE detailed_scraped = 1")
+            self.cursor.execute("SELECT COUNT(*) FROM agency WHERE detailed_scraped = 1")
             return self.cursor.fetchone()[0]
     
-    def start_scraping_session(self):
-        """Record the start of a scraping session"""
+    @staticmethod
+    def category_task_key(category_id):
+        """work_queue key of a whole category"""
+        return f"category:{category_id}"
+    
+    @staticmethod
+    def page_task_key(category_id, page):
+        """work_queue key of one listing page of a category"""
+        return f"page:{category_id}:{page}"
+    
+    def enqueue_categories(self, session_id, category_ids):
+        """Add a pending task for each category (existing tasks are left alone)"""
+        self._execute_many_write(
+            "INSERT OR IGNORE INTO work_queue (session_id, task_key, task_type, category_id, status) VALUES (?, ?, 'category', ?, 'pending')",
+            [(session_id, self.category_task_key(category_id), category_id) for category_id in category_ids]
+        )
+    
+    @staticmethod
+    def detail_task_key(agency_id):
+        """work_queue key of one agency detail page"""
+        return f"detail:{agency_id}"
+    
+    def enqueue_details(self, session_id, agency_ids):
+        """Add a pending task for each agency detail page (existing tasks are left alone)"""
+        self._execute_many_write(
+            "INSERT OR IGNORE INTO work_queue (session_id, task_key, task_type, agency_id, status) VALUES (?, ?, 'detail', ?, 'pending')",
+            [(session_id, self.detail_task_key(agency_id), agency_id) for agency_id in agency_ids]
+        )
+    
+    def complete_category(self, session_id, category_id):
+        """Checkpoint a category whose listing pages have all been stored"""
+        self._execute_write(
+            "INSERT INTO work_queue (session_id, task_key, task_type, category_id, status, last_updated) VALUES (?, ?, 'category', ?, 'done', CURRENT_TIMESTAMP) "
+            "ON CONFLICT (session_id, task_key) DO UPDATE SET status = 'done', lease_owner = NULL, last_updated = CURRENT_TIMESTAMP",
+            (session_id, self.category_task_key(category_id), category_id)
+        )
+    
+    def claim_task(self, session_id, task_type, owner, lease_seconds, max_attempts=3):
+        """Lease the next pending task of a type, or one whose lease has expired
+        
+        Returns a dict with task_key, category_id, page, agency_id and
+        attempts, or None when nothing can be claimed right now. The claim is
+        a single UPDATE inside the writer's IMMEDIATE transaction, so two
+        processes can never lease the same task.
+        """
+        def write(cursor):
+            now = time.time()
+            cursor.execute(
+                "UPDATE work_queue SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, last_updated = CURRENT_TIMESTAMP "
+                "WHERE rowid = (SELECT rowid FROM work_queue WHERE session_id = ? AND task_type = ? AND attempts < ? "
+                "AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) ORDER BY category_id, agency_id LIMIT 1) "
+                "RETURNING task_key, category_id, page, agency_id, attempts",
+                (owner, now + lease_seconds, session_id, task_type, max_attempts, now)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            columns = [description[0] for description in cursor.description]
+            return dict(zip(columns, row))
+        
+        return self._write(write)
+    
+    def extend_lease(self, session_id, task_key, owner, lease_seconds):
+        """Push back the expiry of a lease this owner still holds"""
+        self._execute_write(
+            "UPDATE work_queue SET lease_expires = ? WHERE session_id = ? AND task_key = ? AND status = 'leased' AND lease_owner = ?",
+            (time.time() + lease_seconds, session_id, task_key, owner)
+        )
+    
+    def complete_task(self, session_id, task_key):
+        """Mark a leased task as done"""
+        self._execute_write(
+            "UPDATE work_queue SET status = 'done', lease_owner = NULL, last_updated = CURRENT_TIMESTAMP WHERE session_id = ? AND task_key = ?",
+            (session_id, task_key)
+        )
+    
+    def release_task(self, session_id, task_key, owner):
+        """Give a task back for another attempt unless it was completed meanwhile"""
+        self._execute_write(
+            "UPDATE work_queue SET status = 'pending', lease_owner = NULL, last_updated = CURRENT_TIMESTAMP "
+            "WHERE session_id = ? AND task_key = ? AND status = 'leased' AND lease_owner = ?",
+            (session_id, task_key, owner)
+        )
+    
+    def reopen_tasks(self, session_id):
+        """Put every unfinished task of a resumed session back in the queue with fresh attempts"""
+        return self._execute_write(
+            "UPDATE work_queue SET status = 'pending', lease_owner = NULL, attempts = 0 WHERE session_id = ? AND status != 'done'",
+            (session_id,),
+            wait=True
+        )
+    
+    def count_open_tasks(self, session_id, task_type, max_attempts=3):
+        """Count tasks that are leased or can still be claimed"""
+        self._sync_reads()
         with self.lock:
             self.cursor.execute(
+                "SELECT COUNT(*) FROM work_queue WHERE session_id = ? AND task_type = ? "
+                "AND ((status = 'leased' AND lease_expires >= ?) OR (status IN ('pending', 'leased') AND attempts < ?))",
+                (session_id, task_type, time.time(), max_attempts)
+            )
+            return self.cursor.fetchone()[0]
+    
+    def complete_page(self, session_id, category_id, page):
+        """Checkpoint a listing page whose agencies have been stored"""
+        self._execute_write(
+            "INSERT INTO work_queue (session_id, task_key, task_type, category_id, page, status, last_updated) VALUES (?, ?, 'page', ?, ?, 'done', CURRENT_TIMESTAMP) "
+            "ON CONFLICT (session_id, task_key) DO UPDATE SET status = 'done', last_updated = CURRENT_TIMESTAMP",
+            (session_id, self.page_task_key(category_id, page), category_id, page)
+        )
+    
+    def get_done_categories(self, session_id):
+        """Ids of the categories a session has finished"""
+        self._sync_reads()
+        with self.lock:
+            self.cursor.execute(
+                "SELECT category_id FROM work_queue WHERE session_id = ? AND task_type = 'category' AND status = 'done'",
+                (session_id,)
+            )
+            return {row[0] for row in self.cursor.fetchall()}
+    
+    def get_done_pages(self, session_id, category_id):
+        """Listing page numbers of a category that a session has stored"""
+        self._sync_reads()
+        with self.lock:
+            self.cursor.execute(
+                "SELECT page FROM work_queue WHERE session_id = ? AND task_type = 'page' AND category_id = ? AND status = 'done'",
+                (session_id, category_id)
+            )
+            return {row[0] for row in self.cursor.fetchall()}
+    
+    def get_resumable_session(self):
+        """Id of the latest session if it did not complete, or None
+        
+        Only the latest session is considered: once a newer session has
+        completed, older unfinished ones are stale.
+        """
+        self._sync_reads()
+        with self.lock:
+            self.cursor.execute("SELECT id, status FROM scraping_status ORDER BY id DESC LIMIT 1")
+            row = self.cursor.fetchone()
+            if row and row[1] != 'completed':
+                return row[0]
+            return None
+    
+    def save_stage_timings(self, session_id, rows):
+        """Add a run's stage timings to its session
+        
+        Counts and totals accumulate across the processes and resumed runs of
+        a session; percentiles are those of the latest run to report.
+        """
+        self._execute_many_write(
+            "INSERT INTO stage_timings (session_id, stage, count, total_seconds, p50_seconds, p95_seconds, p99_seconds, max_seconds, last_updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (session_id, stage) DO UPDATE SET count = count + excluded.count, total_seconds = total_seconds + excluded.total_seconds, "
+            "p50_seconds = excluded.p50_seconds, p95_seconds = excluded.p95_seconds, p99_seconds = excluded.p99_seconds, "
+            "max_seconds = MAX(max_seconds, excluded.max_seconds), last_updated = CURRENT_TIMESTAMP",
+            [(session_id, row['stage'], row['count'], row['total_seconds'], row['p50_seconds'],
+              row['p95_seconds'], row['p99_seconds'], row['max_seconds']) for row in rows]
+        )
+    
+    def get_scraping_status(self, session_id):
+        """Get the progress counters of a session as a dict"""
+        self._sync_reads()
+        with self.lock:
+            self.cursor.execute(
+                "SELECT categories_total, categories_scraped, agencies_total, agencies_scraped, details_total, details_scraped, status "
+                "FROM scraping_status WHERE id = ?",
+                (session_id,)
+            )
+            row = self.cursor.fetchone()
+            if not row:
+                return {}
+            columns = [description[0] for description in self.cursor.description]
+            return dict(zip(columns, row))
+    
+    def start_scraping_session(self):
+        """Record the start of a scraping session"""
+        def write(cursor):
+            cursor.execute(
                 "INSERT INTO scraping_status (session_start, status) VALUES (CURRENT_TIMESTAMP, 'running')"
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return cursor.lastrowid
+        
+        return self._write(write)
     
     def update_scraping_status(self, session_id, categories_total=None, categories_scraped=None, 
                               agencies_total=None, agencies_scraped=None, details_total=None, 
                               details_scraped=None, status=None):
         """Update the status of a scraping session"""
-        with self.lock:
-            update_fields = []
-            values = []
-            
-            if categories_total is not None:
-                update_fields.append("categories_total = ?")
-                values.append(categories_total)
-            
-            if categories_scraped is not None:
-                update_fields.append("categories_scraped = ?")
-                values.append(categories_scraped)
-            
-            if agencies_total is not None:
-                update_fields.append("agencies_total = ?")
-                values.append(agencies_total)
-            
-            if agencies_scraped is not None:
-                update_fields.append("agencies_scraped = ?")
-                values.append(agencies_scraped)
-            
-            if details_total is not None:
-                update_fields.append("details_total = ?")
-                values.append(details_total)
-            
-            if details_scraped is not None:
-                update_fields.append("details_scraped = ?")
-                values.append(details_scraped)
-            
-            if status is not None:
-                update_fields.append("status = ?")
-                values.append(status)
-            
-            if status == 'completed':
-                update_fields.append("session_end = CURRENT_TIMESTAMP")
+        update_fields = []
+        values = []
+        
+        if categories_total is not None:
+            update_fields.append("categories_total = ?")
+            values.append(categories_total)
+        
+        if categories_scraped is not None:
+            update_fields.append("categories_scraped = ?")
+            values.append(categories_scraped)
+        
+        if agencies_total is not None:
+            update_fields.append("agencies_total = ?")
+            values.append(agencies_total)
+        
+        if agencies_scraped is not None:
+            update_fields.append("agencies_scraped = ?")
+            values.append(agencies_scraped)
+        
+        if details_total is not None:
+            update_fields.append("details_total = ?")
+            values.append(details_total)
+        
+        if details_scraped is not None:
+            update_fields.append("details_scraped = ?")
+            values.append(details_scraped)
+        
+        if status is not None:
+            update_fields.append("status = ?")
+            values.append(status)
+        
+        if status == 'completed':
+            update_fields.append("session_end = CURRENT_TIMESTAMP")
+        
+        if update_fields:
+            query = f"UPDATE scraping_status SET {', '.join(update_fields)} WHERE id = ?"
+            values.append(session_id)
             
-            if update_fields:
-                query = f"UPDATE scraping_status SET {', '.join(update_fields)} WHERE id = ?"
-                values.append(session_id)
-                
-                self.cursor.execute(query, values)
-                self.conn.commit()
+            self._execute_write(query, values)
     
-    def export_to_csv(self, export_dir="iboss_data"):
-        """Export database contents to CSV files"""
+    def export(self, export_dir="iboss_data", formats=("csv",)):
+        """Export database contents in each of formats ("csv", "parquet")"""
+        exporters = {"csv": self.export_to_csv, "parquet": self.export_to_parquet}
+        results = [exporters[export_format](export_dir) for export_format in formats]
+        return all(results)
+    
+    def _open_export_snapshot(self):
+        """Read-only connection of its own, in a read transaction so every table comes from one snapshot"""
+        # Export what has been queued so far
+        self._sync_reads()
+        # pyarrow's dataset writer pulls the batches from a thread of its own
+        conn = sqlite3.connect(
+            f"{Path(os.path.abspath(self.db_path)).as_uri()}?mode=ro", uri=True, check_same_thread=False
+        )
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("BEGIN")
+        return conn
+    
+    def export_to_csv(self, export_dir="iboss_data", chunk_size=EXPORT_CHUNK_ROWS):
+        """Export database contents to CSV files
+        
+        Rows are streamed from a read-only connection of their own in chunks of
+        chunk_size, so memory stays flat and the scraper's connection is never
+        locked. All files are read from one snapshot of the database.
+        """
         print(f"Exporting database to CSV files in {export_dir}")
         
         # Ensure directory exists
         os.makedirs(export_dir, exist_ok=True)
         
-        with self.lock:
-            try:
-                # Export categories
-                self.cursor.execute("SELECT * FROM categories")
-                categories = self.cursor.fetchall()
-                
-                if categories:
-                    df_categories = pd.DataFrame(categories, columns=[
-                        'id', 'category_name', 'category_link', 'agency_count', 'scraped', 'last_updated'
-                    ])
-                    category_path = os.path.join(export_dir, 'categories.csv')
-                    df_categories.to_csv(category_path, index=False, encoding='utf-8-sig')
-                    print(f"Exported {len(categories)} categories to {category_path}")
-                
-                # Export agencies
-                self.cursor.execute("SELECT * FROM agencies")
-                agencies = self.cursor.fetchall()
-                
-                if agencies:
-                    df_agencies = pd.DataFrame(agencies, columns=[
-                        'id', 'category_id', 'category_name', 'agency_name', 'agency_url', 
-                        'agency_logo', 'local_logo_path', 'agency_desc', 'agency_idx', 'agency_detail_url', 
-                        'agency_detail_desc', 'detailed_scraped', 'last_updated'
-                    ])
-                    agency_path = os.path.join(export_dir, 'agencies.csv')
-                    df_agencies.to_csv(agency_path, index=False, encoding='utf-8-sig')
-                    print(f"Exported {len(agencies)} agencies to {agency_path}")
-                
-                # Export scraping status
-                self.cursor.execute("SELECT * FROM scraping_status")
-                status = self.cursor.fetchall()
-                
-                if status:
-                    df_status = pd.DataFrame(status, columns=[
-                        'id', 'session_start', 'session_end', 'categories_total', 
-                        'categories_scraped', 'agencies_total', 'agencies_scraped',
-                        'details_total', 'details_scraped', 'status'
-                    ])
-                    status_path = os.path.join(export_dir, 'scraping_status.csv')
-                    df_status.to_csv(status_path, index=False, encoding='utf-8-sig')
-                    print(f"Exported scraping status to {status_path}")
+        conn = None
+        try:
+            conn = self._open_export_snapshot()
+            
+            for table, label in EXPORT_TABLES:
+                cursor = conn.execute(f"SELECT * FROM {table}")
+                path = os.path.join(export_dir, f"{table}.csv")
+                count = self._stream_to_csv(cursor, path, chunk_size)
+                if count:
+                    print(f"Exported {count} {label} to {path}")
+            
+            return True
+        
+        except Exception as e:
+            print(f"Error exporting to CSV: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
+    def export_to_parquet(self, export_dir="iboss_data", chunk_size=EXPORT_CHUNK_ROWS):
+        """Export database contents to zstd-compressed Parquet files with typed columns
+        
+        Streams record batches of chunk_size rows from the same kind of snapshot
+        as export_to_csv. Tables in PARQUET_PARTITIONS are written as a directory
+        split by the partition column (agencies.parquet/category_name=.../).
+        Needs pyarrow, which is only imported here.
+        """
+        try:
+            import parquet_export
+        except ImportError as e:
+            print(f"Parquet export needs pyarrow (pip install pyarrow): {e}")
+            return False
+        
+        print(f"Exporting database to Parquet files in {export_dir}")
+        os.makedirs(export_dir, exist_ok=True)
+        
+        conn = None
+        try:
+            conn = self._open_export_snapshot()
+            
+            for table, label in EXPORT_TABLES:
+                schema = parquet_export.table_schema(conn, table)
+                cursor = conn.execute(f"SELECT * FROM {table}")
+                path = os.path.join(export_dir, f"{table}.parquet")
                 
-                return True
+                # Written next to the target and swapped in, so readers never see a partial export
+                temp_path = f"{path}.part"
+                self._remove_path(temp_path)
+                try:
+                    count = parquet_export.write_table(cursor, schema, temp_path, chunk_size, PARQUET_PARTITIONS.get(table))
+                    if count:
+                        self._remove_path(path)
+                        os.replace(temp_path, path)
+                finally:
+                    self._remove_path(temp_path)
+                if count:
+                    print(f"Exported {count} {label} to {path}")
             
-            except Exception as e:
-                print(f"Error exporting to CSV: {e}")
-                return False
+            return True
+        
+        except Exception as e:
+            print(f"Error exporting to Parquet: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
+    def _remove_path(self, path):
+        """Remove a file or directory left by an earlier export"""
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    
+    def _stream_to_csv(self, cursor, path, chunk_size):
+        """Write a cursor's rows to path chunk by chunk; returns the row count (no file if 0)"""
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return 0
+        
+        # Written next to the target and renamed, so readers never see a half-written file
+        temp_path = f"{path}.part"
+        count = 0
+        try:
+            with open(temp_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(column[0] for column in cursor.description)
+                while rows:
+                    writer.writerows(rows)
+                    count += len(rows)
+                    rows = cursor.fetchmany(chunk_size)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return count
     
     def close(self):
-        """Close the database connection"""
+        """Commit queued writes, stop the writer thread and close the connection"""
+        if getattr(self, 'writer_thread', None):
+            self.write_queue.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+        
         if hasattr(self, 'conn') and self.conn:
             self.conn.close()
+            self.conn = None
+
+
+def finish_session(db, progress, export_dir, export_formats, logo_downloader=None):
+    """Wait for logo downloads, export the results and mark the session completed
+    
+    Shared by every engine once its crawl is done (the async engine runs it in a thread).
+    """
+    # Let queued logo downloads finish so the export has their paths
+    if logo_downloader:
+        logo_downloader.join()
+    
+    # Write the latest counters so the export includes them
+    progress.flush()
+    
+    # Export all data in the requested formats
+    db.export(export_dir, export_formats)
+    
+    # Update scraping status
+    progress.flush(status='completed')
+    
+    print("Scraping completed successfully!")
 
 
 class IBossScraper:
-    def __init__(self, headless=False, db_path="iboss_data/iboss_scraper.db", target_categories=None, max_agencies_per_category=0, skip_details=False, output_dir="iboss_data"):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=headless)
-        self.context = self.browser.new_context(viewport={"width": 1920, "height": 1080})
-        self.page = self.context.new_page()
+    # Pages scraping at once (the async engine overrides this)
+    concurrency = 1
+    
+    def __init__(self, headless=False, db_path="iboss_data/iboss_scraper.db", target_categories=None, max_agencies_per_category=0, skip_details=False, output_dir="iboss_data", fetch_mode="browser", logo_workers=4, block_resources=DEFAULT_BLOCKED_RESOURCE_TYPES, block_trackers=True, refresh=False, resume=False, session_id=None, progress=None, db=None, max_rps=2.0, base_url=DEFAULT_BASE_URL, record_har=None, replay_har=None, export_formats=("csv",)):
+        self.headless = headless
+        # Formats written by Database.export at the end of scrape_all
+        self.export_formats = export_formats
         
-        # Set default timeout
-        self.page.set_default_timeout(30000)
+        # Record the browser's traffic to a HAR archive, or serve it back from one without network.
+        # Only browser traffic is in the archive, so plain HTTP fetches are off in both modes;
+        # a replay also skips logo downloads and runs without a rate cap.
+        self.record_har = record_har
+        self.replay_har = replay_har
+        if (record_har or replay_har) and fetch_mode != "browser":
+            print("HAR record/replay covers browser traffic only, using --fetch-mode browser")
+            fetch_mode = "browser"
+        if replay_har:
+            logo_workers = 0
+            max_rps = 0
+        
+        # Abort requests for resources the scraper never reads
+        self.resource_filter = ResourceFilter(block_resources, block_trackers)
         
-        self.base_url = "https://www.i-boss.co.kr"
+        self.base_url = base_url.rstrip("/")
         
         # Create directory for data if it doesn't exist
         self.data_dir = output_dir
@@ -351,19 +1108,34 @@ class IBossScraper:
         self.logos_dir = os.path.join(self.data_dir, "logos")
         os.makedirs(self.logos_dir, exist_ok=True)
         
-        # Initialize database
-        self.db = Database(db_path)
+        # Latency of every scraping stage, reported when the scraper closes
+        self.timings = StageTimings()
+        # Navigations attempted again after an error or throttled response (see metrics.py)
+        self.navigation_retries = 0
         
-        # Initialize scraping session
-        self.session_id = self.db.start_scraping_session()
+        # Initialize database (remote workers pass a proxy to the coordinator instead)
+        self.db = db or Database(db_path, timings=self.timings)
         
-        # Track statistics
-        self.categories_total = 0
-        self.categories_scraped = 0
-        self.agencies_total = 0
-        self.agencies_scraped = 0
-        self.details_total = 0
-        self.details_scraped = 0
+        # Initialize scraping session, or pick up the one an interrupted run left behind.
+        # Worker processes join the coordinator's session instead.
+        resumed_session = session_id or (self.db.get_resumable_session() if resume else None)
+        if session_id:
+            self.session_id = session_id
+        elif resumed_session:
+            self.session_id = resumed_session
+            print(f"Resuming scraping session {self.session_id}")
+        else:
+            self.session_id = self.db.start_scraping_session()
+        self.resume = resumed_session is not None
+        
+        # Download logos in the background while pages are scraped (0 workers leaves logos to the coordinator)
+        self.logo_downloader = LogoDownloader(self.db, self.logos_dir, workers=logo_workers, timings=self.timings) if logo_workers > 0 else None
+        
+        # Track statistics; counters are flushed to scraping_status in batches
+        self.progress = progress or ProgressTracker(self.db, self.session_id)
+        if self.resume and not progress:
+            self.progress.restore(self.db.get_scraping_status(self.session_id))
+            self.progress.flush(status='running')
         
         # Filter categories to scrape if specified
         self.target_categories = target_categories
@@ -373,25 +1145,88 @@ class IBossScraper:
         
         # Skip detailed descriptions if specified
         self.skip_details = skip_details
+        
+        # Incremental re-crawl: re-fetch changed details and flag removed agencies
+        self.refresh = refresh
+        
+        # Pace requests per host, backing off when the site slows down or throttles
+        self.rate_limiter = AdaptiveRateLimiter(max_rps, max_concurrency=self.concurrency, timings=self.timings)
+        
+        # Fetch detail pages over plain HTTP first if requested
+        self.fetch_mode = fetch_mode
+        self.detail_fetcher = DetailFetcher(rate_limiter=self.rate_limiter, timings=self.timings) if fetch_mode == "http" else None
+        
+        self._start_browser()
+
+    def _start_browser(self):
+        """Launch the browser and open the page used for scraping"""
+        self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(headless=self.headless)
+        self.context = self.browser.new_context(**self.context_options())
+        if self.resource_filter.enabled:
+            self.context.route("**/*", self.resource_filter.handle_route)
+        if self.replay_har:
+            # Registered last so it answers first; anything not in the archive is aborted
+            self.context.route_from_har(self.replay_har, not_found="abort")
+        self.page = self.context.new_page()
+
+        # Set default timeout
+        self.page.set_default_timeout(30000)
+
+    def context_options(self):
+        """Options of the browser context, including HAR recording"""
+        options = {"viewport": {"width": 1920, "height": 1080}}
+        if self.record_har:
+            # A .zip path stores response bodies as compressed attachments
+            options["record_har_path"] = self.record_har
+            options["record_har_mode"] = "full"
+            print(f"Recording network traffic to {self.record_har}")
+        return options
+    
+    def pending_categories(self, categories):
+        """Checkpoint the categories of this session and drop those a resumed run already finished"""
+        self.db.enqueue_categories(self.session_id, [cat['id'] for cat in categories])
+        if not self.resume:
+            return categories
+        
+        done = self.db.get_done_categories(self.session_id)
+        if done:
+            print(f"Skipping {len([cat for cat in categories if cat['id'] in done])} categories finished before the restart")
+        return [cat for cat in categories if cat['id'] not in done]
     
+    def filter_categories(self, categories):
+        """Keep only the categories requested via target_categories"""
+        if self.target_categories:
+            print(f"Filtering categories to: {self.target_categories}")
+            categories = [cat for cat in categories if cat['category_name'] in self.target_categories]
+            print(f"Found {len(categories)} matching categories")
+        return categories
+
     def navigate_to_url(self, url, retries=3):
         """Navigate to a URL and handle loading"""
         for attempt in range(retries):
+            if attempt:
+                self.navigation_retries += 1
             try:
                 # Check if URL is absolute, if not make it absolute
                 if not url.startswith(('http://', 'https://')):
                     url = f"{self.base_url}{url}"
                     
                 print(f"Navigating to: {url}")
-                self.page.goto(url, wait_until="domcontentloaded")
-                self.page.wait_for_load_state("networkidle")
-                time.sleep(2)  # Additional wait for content to load
+                # The limiter waits out the backoff of earlier failures before the next attempt
+                with self.rate_limiter.request(url) as request, self.timings.stage('navigate'):
+                    response = self.page.goto(url, wait_until="domcontentloaded")
+                    if response:
+                        request.record(response.status, response.headers.get("retry-after"))
+                if request.throttled:
+                    print(f"Server returned {request.status} for {url} (attempt {attempt+1}/{retries})")
+                    continue
+                with self.timings.stage('network_idle'):
+                    self.page.wait_for_load_state("networkidle")
                 return True
             except Exception as e:
                 print(f"Error navigating to {url} (attempt {attempt+1}/{retries}): {e}")
-                if attempt == retries - 1:
-                    return False
-                time.sleep(2)  # Wait before retry
+        return False
     
     def get_categories(self):
         """Get all agency categories from the main page"""
@@ -407,8 +1242,7 @@ class IBossScraper:
             # Find all category elements
             category_elements = self.page.query_selector_all("#_LF_agency_dir > div.bg_fff.fix_1050 > div:nth-child(1) > div.category_wrap > ul > li > a")
             
-            self.categories_total = len(category_elements)
-            self.db.update_scraping_status(self.session_id, categories_total=self.categories_total)
+            self.progress.set('categories_total', len(category_elements))
             
             categories_data = []
             for element in tqdm(category_elements):
@@ -458,49 +1292,230 @@ class IBossScraper:
             print(f"Error extracting agency idx: {e}")
             return None
     
+    def build_agency_record(self, raw_agency):
+        """Turn a row returned by AGENCY_LIST_JS into an agency record"""
+        agency_idx = self.extract_agency_idx(raw_agency.get('href'))
+        agency_detail_url = f"{self.base_url}/ab-7554-{agency_idx}" if agency_idx else None
+        
+        return {
+            'agency_name': raw_agency['name'],
+            'agency_url': raw_agency.get('url') or "N/A",
+            'agency_logo': raw_agency.get('logo') or "N/A",
+            'agency_desc': raw_agency.get('desc') or "N/A",
+            'agency_idx': agency_idx,
+            'agency_detail_url': agency_detail_url
+        }
+    
     def download_logo(self, logo_url, category_name, agency_name):
-        """Download agency logo and save it as [category_name].png"""
-        if not logo_url or logo_url == "N/A":
-            print(f"No logo URL available for {agency_name}")
+        """Download agency logo right away and return its local path"""
+        if not self.logo_downloader:
             return None
+        return self.logo_downloader.download(logo_url, agency_name)
+    
+    def store_agencies(self, category_id, category_name, raw_agencies, agencies_data, page=None):
+        """Store the rows extracted from one listing page and queue their logos
+        
+        Appends the stored records to agencies_data and returns True once
+        max_agencies_per_category has been reached. When page is given, the
+        page is checkpointed in the work queue once its rows are stored.
+        """
+        page_agencies = []
+        for idx, raw_agency in enumerate(raw_agencies):
+            # Check if we've reached the maximum number of agencies to collect
+            if self.max_agencies_per_category > 0 and len(agencies_data) + len(page_agencies) >= self.max_agencies_per_category:
+                break
             
-        try:
-            # Sanitize filename (remove invalid characters)
-            sanitized_category = re.sub(r'[\\/*?:"<>|]', "_", category_name)
-            sanitized_agency = re.sub(r'[\\/*?:"<>|]', "_", agency_name)
-            
-            # Create logo filename
-            logo_filename = f"{sanitized_category}_{sanitized_agency}.png"
-            logo_path = os.path.join(self.logos_dir, logo_filename)
+            try:
+                if not raw_agency:
+                    print(f"Could not find agency name for agency {idx+1}. Skipping this agency.")
+                    continue
+                
+                agency = self.build_agency_record(raw_agency)
+                print(f"Processing agency {idx+1}/{len(raw_agencies)}: {agency['agency_name']}")
+                
+                # The logo path is filled in once its download finishes
+                agency['local_logo_path'] = None
+                page_agencies.append(agency)
             
-            # Check if file already exists
-            if os.path.exists(logo_path):
-                print(f"Logo for {agency_name} already exists at {logo_path}")
-                return logo_path
+            except Exception as e:
+                print(f"Error extracting agency data for agency {idx+1}: {e}")
+                import traceback
+                traceback.print_exc()
+        
+        stored = True
+        if page_agencies:
+            try:
+                # Store the whole page in one transaction
+                with self.timings.stage('store_page'):
+                    agency_ids = self.db.insert_agencies_many(
+                        category_id, category_name, page_agencies,
+                        session_id=self.session_id, refresh=self.refresh
+                    )
+                for agency, agency_id in zip(page_agencies, agency_ids):
+                    agency['id'] = agency_id
+                    if self.logo_downloader:
+                        self.logo_downloader.submit(agency_id, agency['agency_logo'], agency['agency_name'])
                 
-            print(f"Downloading logo for {agency_name} from {logo_url}")
+                self.progress.increment('agencies_scraped', len(page_agencies))
+                
+                agencies_data.extend(page_agencies)
             
-            # Download the image
-            response = requests.get(logo_url, stream=True, timeout=10)
-            if response.status_code == 200:
-                with open(logo_path, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                print(f"Logo saved to {logo_path}")
-                return logo_path
+            except Exception as e:
+                print(f"Error storing {len(page_agencies)} agencies for category {category_name}: {e}")
+                import traceback
+                traceback.print_exc()
+                stored = False
+        
+        # An empty page may have failed to load, so only pages with rows are checkpointed
+        if page is not None and stored and raw_agencies:
+            self.db.complete_page(self.session_id, category_id, page)
+        
+        if self.max_agencies_per_category > 0 and len(agencies_data) >= self.max_agencies_per_category:
+            print(f"Reached maximum number of agencies ({self.max_agencies_per_category}) for category {category_name}")
+            return True
+        return False
+    
+    def _click_next_page(self, category_name, current_page):
+        """Find and click the next page button, returning False on the last page"""
+        # First look for pagination controls - try multiple selectors
+        pagination = None
+        for selector in PAGINATION_SELECTORS:
+            try:
+                pagination = self.page.query_selector(selector)
+                if pagination:
+                    print(f"Found pagination with selector: {selector}")
+                    break
+            except Exception:
+                continue
+
+        if not pagination:
+            print("No pagination controls found, assuming this is the only page")
+            # Take a screenshot for debugging
+            screenshot_path = f"{self.data_dir}/pagination_debug_{category_name}_{current_page}.png"
+            self.page.screenshot(path=screenshot_path)
+            print(f"Screenshot saved to {screenshot_path}")
+            return False
+
+        # Output the HTML of the pagination element for debugging
+        pagination_html = pagination.inner_html()
+        print(f"Pagination HTML: {pagination_html[:200]}..." if len(pagination_html) > 200 else pagination_html)
+
+        # Find all links within pagination
+        page_links = pagination.query_selector_all("a") or pagination.query_selector_all("button") or pagination.query_selector_all("span[onclick]")
+
+        if not page_links:
+            print("No pagination links found, assuming this is the only page")
+            return False
+
+        print(f"Found {len(page_links)} pagination links")
+
+        # Look for a "Next" button - try various text patterns
+        next_button = None
+        next_text_patterns = ['다음', '>', 'next', '→', '▶', 'Next Page', '다음 페이지']
+
+        for elem in page_links:
+            elem_text = elem.inner_text().strip()
+            elem_html = elem.inner_html()
+            print(f"Pagination element: text='{elem_text}', html='{elem_html[:50]}...'")
+
+            # Check text content
+            if any(pattern in elem_text or pattern == elem_text for pattern in next_text_patterns):
+                next_button = elem
+                print(f"Found next button with text: {elem_text}")
+                break
+
+            # Check for SVG or image-based next buttons
+            if "next" in elem_html.lower() or "arr" in elem_html.lower() or "right" in elem_html.lower():
+                next_button = elem
+                print(f"Found next button with HTML containing next/arrow indicators")
+                break
+
+            # Check aria-label
+            aria_label = elem.get_attribute('aria-label') or ''
+            if any(pattern in aria_label.lower() for pattern in ['next', '다음']):
+                next_button = elem
+                print(f"Found next button with aria-label: {aria_label}")
+                break
+
+        # If still not found, try to find by position (last item or after current page)
+        if not next_button and len(page_links) > 1:
+            # Try to identify current page using known class names
+            current_page_elem = None
+            for elem in page_links:
+                class_attr = elem.get_attribute('class') or ''
+                # 추가: LF_page_link_current 클래스 확인
+                if ('LF_page_link_current' in class_attr) or ('active' in class_attr) or ('current' in class_attr):
+                    current_page_elem = elem
+                    print(f"Found current page element with class: {class_attr}")
+                    break
+
+            if current_page_elem:
+                # Try to get the next sibling
+                try:
+                    # JavaScript로 현재 페이지 다음 링크 찾기
+                    next_button = self.page.evaluate("""
+                        (element) => {
+                            const nextSibling = element.nextElementSibling;
+                            return nextSibling && nextSibling.tagName.toLowerCase() === 'a' ? nextSibling : null;
+                        }
+                    """, current_page_elem)
+                    if next_button:
+                        print("Found next button as sibling of current page element")
+                except Exception as e:
+                    print(f"Error finding next sibling: {e}")
+
+                # 다음 페이지 버튼을 찾지 못한 경우, LF_page_link_current 다음 버튼 찾기 시도
+                if not next_button:
+                    try:
+                        # 숫자 버튼들 중에서 현재 페이지 다음 버튼 찾기
+                        current_page_num = int(current_page_elem.inner_text().strip())
+                        print(f"Current page number: {current_page_num}")
+
+                        for elem in page_links:
+                            try:
+                                page_num = int(elem.inner_text().strip())
+                                if page_num == current_page_num + 1:
+                                    next_button = elem
+                                    print(f"Found next page button with number: {page_num}")
+                                    break
+                            except ValueError:
+                                # 숫자가 아닌 텍스트는 무시
+                                continue
+                    except Exception as e:
+                        print(f"Error finding next page by number: {e}")
             else:
-                print(f"Failed to download logo: HTTP status {response.status_code}")
-                return None
-                
+                # Try the last link if it might be a next button
+                last_link = page_links[-1]
+                last_text = last_link.inner_text().strip()
+                if last_text not in ['처음', '첫 페이지', '<<', 'first', '맨앞']:
+                    next_button = last_link
+                    print(f"Using last pagination link as potential next button: {last_text}")
+
+        if not next_button:
+            print("No next button found, reached last page")
+            return False
+        
+        # Check if the button is disabled
+        cls = next_button.get_attribute('class') or ''
+        if 'disabled' in cls or 'none' in cls:
+            print(f"Next button is disabled (class: {cls}), reached last page")
+            return False
+        
+        print("Clicking next page button")
+        previous_signature = listing_signature(self.page)
+        next_button.click()
+        try:
+            # Wait for the current-page marker and rows to change
+            wait_for_listing_change(self.page, previous_signature)
+            return True
         except Exception as e:
-            print(f"Error downloading logo for {agency_name}: {e}")
-            return None
+            print(f"Listing did not change after clicking next, assuming last page: {e}")
+            return False
     
-    def get_agencies_in_category(self, category_id, category_name, category_url):
+    def get_agencies_in_category(self, category_id, category_name, category_url, agency_count=None):
         """Get all agencies within a specific category"""
         print(f"\nExtracting agencies for category: {category_name}")
         agencies_data = []
-        agencies_collected = 0
         
         try:
             # Navigate to category page
@@ -509,363 +1524,135 @@ class IBossScraper:
             # Look for the agency list selector
             try:
                 print("Waiting for agency list selector...")
-                self.page.wait_for_selector("div._list > div", timeout=10000)
+                with self.timings.stage('wait_listing'):
+                    self.page.wait_for_selector("div._list > div", timeout=10000)
                 print("Agency list selector found.")
             except Exception as e:
                 print(f"Warning: Agency list not found immediately, trying alternate approach: {e}")
-                # Try an alternative approach - sometimes div._list might be loaded dynamically
-                time.sleep(5)
+                # Sometimes div._list is loaded dynamically or uses the alternate layout
+                try:
+                    with self.timings.stage('wait_listing'):
+                        wait_for_listing_rows(self.page, timeout=5000)
+                except Exception:
+                    print("Still no agency rows after waiting")
                 
             # Initialize pagination parameters
             current_page = 1
-            has_next_page = True
+            page_scheme = None
+            total_pages = None
+            previous_first_row = None
+            # Only a walk that reaches the last page can tell which agencies are gone
+            complete = False
+            reached_limit = False
+            
+            # Pages stored by the interrupted run of a resumed session
+            done_pages = self.db.get_done_pages(self.session_id, category_id) if self.resume else set()
             
             # Process all pages
-            while has_next_page:
+            while True:
                 print(f"Processing page {current_page}...")
                 
-                # Wait a bit for content to load
-                time.sleep(2)
-                
-                # Find all agency listings on current page
-                agency_elements = self.page.query_selector_all("div._list > div")
-                
-                if not agency_elements:
-                    print("No agency elements found on this page. Checking if we need a different selector...")
-                    # Sometimes the structure might be different
-                    alternate_elements = self.page.query_selector_all("div.conts div[class^='list_'] > div")
-                    if alternate_elements:
-                        print(f"Found {len(alternate_elements)} agencies using alternate selector")
-                        agency_elements = alternate_elements
-                
-                print(f"Found {len(agency_elements)} agency elements")
-                
-                # Debug: Print the HTML structure of the first element if available
-                if agency_elements and len(agency_elements) > 0:
-                    print("First element HTML structure:")
-                    print(agency_elements[0].inner_html()[:200] + "..." if len(agency_elements[0].inner_html()) > 200 else agency_elements[0].inner_html())
+                # Extract every agency row on the page in a single round-trip
+                with self.timings.stage('extract_listing'):
+                    raw_agencies = self.page.evaluate(AGENCY_LIST_JS)
+                print(f"Found {len(raw_agencies)} agency elements")
                 
-                for idx, agency in enumerate(agency_elements):
-                    try:
-                        # Check if we've reached the maximum number of agencies to collect
-                        if self.max_agencies_per_category > 0 and agencies_collected >= self.max_agencies_per_category:
-                            print(f"Reached maximum number of agencies ({self.max_agencies_per_category}) for category {category_name}")
-                            has_next_page = False
-                            break
-                        
-                        print(f"Processing agency {idx+1}/{len(agency_elements)}...")
-                        
-                        # Get agency elements
-                        agency_html = agency.inner_html()
-                        print(f"Agency HTML: {agency_html[:100]}..." if len(agency_html) > 100 else agency_html)
-                        
-                        # Extract data from each agency listing
-                        agency_name_elem = agency.query_selector("a.link_tit > span.AB-LF-common") or agency.query_selector("a > span[class*='AB-']")
-                        
-                        if not agency_name_elem:
-                            print(f"No agency name element found for agency {idx+1}. Trying alternative selectors...")
-                            agency_name_elem = agency.query_selector("a[class*='link_'] > span") or agency.query_selector("a > span")
-                        
-                        if not agency_name_elem:
-                            print(f"Still could not find agency name for agency {idx+1}. Skipping this agency.")
-                            continue
-                            
-                        agency_name = agency_name_elem.inner_text() if agency_name_elem else "N/A"
-                        print(f"Agency name: {agency_name}")
-                        
-                        # Get agency idx from the link
-                        link_elem = None
-                        href = None
-                        if agency_name_elem:
-                            try:
-                                # Try to directly find the closest anchor tag
-                                link_elem = agency.query_selector("a.link_tit") or agency.query_selector("a[href*='idx=']")
-                                print(f"Direct link element search: {link_elem}")
-                                
-                                if not link_elem:
-                                    # Try the JS evaluate approach to find the closest parent anchor
-                                    try:
-                                        link_js = agency_name_elem.evaluate("""
-                                            node => {
-                                                const closest = node.closest('a');
-                                                return closest ? closest.getAttribute('href') : null;
-                                            }
-                                        """)
-                                        if link_js:
-                                            href = link_js
-                                            print(f"Link href from JS evaluation: {href}")
-                                    except Exception as e:
-                                        print(f"Error in JS evaluation: {e}")
-                                else:
-                                    # Get href from the direct link element
-                                    href = link_elem.get_attribute('href')
-                                    print(f"Link href from direct element: {href}")
-                            except Exception as e:
-                                print(f"Error finding link element: {e}")
-                        
-                        agency_idx = None
-                        agency_detail_url = None
-                        
-                        if href:
-                            try:
-                                agency_idx = self.extract_agency_idx(href)
-                                if agency_idx:
-                                    agency_detail_url = f"{self.base_url}/ab-7554-{agency_idx}"
-                                    print(f"Agency detail URL: {agency_detail_url}")
-                            except Exception as e:
-                                print(f"Error extracting agency_idx: {e}")
-                        
-                        # Get URL element - may be different structure
-                        agency_url_elem = agency.query_selector("div.url > a.link_tit") or agency.query_selector("div.url > a")
-                        if not agency_url_elem:
-                            print(f"No URL element found for agency {idx+1}. Trying alternative selectors...")
-                            agency_url_elem = agency.query_selector("div[class*='url'] > a") or agency.query_selector("a[class*='link_url']")
-                        
-                        agency_url = agency_url_elem.inner_text() if agency_url_elem else "N/A"
-                        print(f"Agency URL: {agency_url}")
-                        
-                        # Get logo URL
-                        logo_elem = agency.query_selector("div.logo_thumb > a > img") or agency.query_selector("div[class*='logo'] > a > img")
-                        if not logo_elem:
-                            print(f"No logo element found for agency {idx+1}. Trying alternative selectors...")
-                            logo_elem = agency.query_selector("div[class*='logo'] img") or agency.query_selector("img[class*='logo']") or agency.query_selector("img")
-                        
-                        logo_url = None
-                        if logo_elem:
-                            try:
-                                logo_url = logo_elem.get_attribute('src')
-                                print(f"Logo URL: {logo_url}")
-                            except Exception as e:
-                                print(f"Error getting logo src: {e}")
-                                logo_url = "N/A"
-                        else:
-                            logo_url = "N/A"
-                            
-                        # Download the logo
-                        local_logo_path = None
-                        if logo_url and logo_url != "N/A":
-                            local_logo_path = self.download_logo(logo_url, category_name, agency_name)
-                        
-                        # Get description
-                        desc_elem = agency.query_selector("p.desc") or agency.query_selector("p[class*='desc']")
-                        if not desc_elem:
-                            print(f"No description element found for agency {idx+1}. Trying alternative selectors...")
-                            desc_elem = agency.query_selector("p") or agency.query_selector("div[class*='desc']")
-                        
-                        description = desc_elem.inner_text() if desc_elem else "N/A"
-                        print(f"Description: {description[:50]}..." if len(description) > 50 else description)
-                        
-                        # Store in database
-                        agency_id = self.db.insert_agency(
-                            category_id,
-                            category_name,
-                            agency_name,
-                            agency_url,
-                            logo_url,
-                            description,
-                            agency_idx,
-                            agency_detail_url,
-                            local_logo_path
-                        )
-                        
-                        self.agencies_scraped += 1
-                        agencies_collected += 1
-                        self.db.update_scraping_status(
-                            self.session_id, 
-                            agencies_scraped=self.agencies_scraped
-                        )
-                        
-                        agencies_data.append({
-                            'id': agency_id,
-                            'agency_name': agency_name,
-                            'agency_url': agency_url,
-                            'agency_logo': logo_url,
-                            'local_logo_path': local_logo_path,
-                            'agency_desc': description,
-                            'agency_idx': agency_idx,
-                            'agency_detail_url': agency_detail_url
-                        })
-                        
-                        print(f"Successfully processed agency: {agency_name}")
-                        
-                    except Exception as e:
-                        print(f"Error extracting agency data for agency {idx+1}: {e}")
-                        import traceback
-                        traceback.print_exc()
+                # Out-of-range pages may be empty or repeat the last page
+                if not raw_agencies or (current_page > 1 and raw_agencies[0] == previous_first_row):
+                    if current_page > 1:
+                        print("No new agencies on this page, reached last page")
+                        complete = True
+                    else:
+                        # An empty first page may have failed to load, so the category is retried
+                        print("No agencies on the first page")
+                    break
+                previous_first_row = raw_agencies[0]
                 
-                # Check if we've reached the maximum number of agencies to collect
-                if self.max_agencies_per_category > 0 and agencies_collected >= self.max_agencies_per_category:
-                    print(f"Reached maximum number of agencies ({self.max_agencies_per_category}) for category {category_name}")
-                    has_next_page = False
+                if current_page in done_pages:
+                    print(f"Page {current_page} was stored before the restart, skipping")
+                elif self.store_agencies(category_id, category_name, raw_agencies, agencies_data, page=current_page):
+                    reached_limit = True
                     break
                 
-                # Try to find and click the next page button if available
+                # Learn the page URL scheme once, from the first page's links
+                if page_scheme is None:
+                    links = self.page.evaluate(PAGINATION_LINKS_JS)
+                    page_scheme = learn_page_url_scheme(self.page.url, links) or False
+                    total_pages = estimate_page_count(agency_count, len(raw_agencies), self.max_agencies_per_category)
+                    if page_scheme:
+                        print(f"Paginating by URL parameter '{page_scheme['param']}' ({total_pages or 'unknown'} pages)")
+                    else:
+                        print("No page URL scheme found, paginating by clicking")
+                
                 try:
-                    # First look for pagination controls - try multiple selectors
-                    pagination_selectors = [
-                        "div.paging", 
-                        "div[class*='paging']",
-                        "ul.pagination",
-                        "div.pagination",
-                        "nav.pagination",
-                        ".page_nav",
-                        "[class*='pagination']",
-                        "[class*='page_navi']",
-                        "div.bbsPaging"
-                    ]
-                    
-                    pagination = None
-                    for selector in pagination_selectors:
-                        try:
-                            pagination = self.page.query_selector(selector)
-                            if pagination:
-                                print(f"Found pagination with selector: {selector}")
-                                break
-                        except Exception:
-                            continue
-                    
-                    if not pagination:
-                        print("No pagination controls found, assuming this is the only page")
-                        # Take a screenshot for debugging
-                        screenshot_path = f"{self.data_dir}/pagination_debug_{category_name}_{current_page}.png"
-                        self.page.screenshot(path=screenshot_path)
-                        print(f"Screenshot saved to {screenshot_path}")
-                        has_next_page = False
-                        continue
-                    
-                    # Output the HTML of the pagination element for debugging
-                    pagination_html = pagination.inner_html()
-                    print(f"Pagination HTML: {pagination_html[:200]}..." if len(pagination_html) > 200 else pagination_html)
-                    
-                    # Find all links within pagination
-                    page_links = pagination.query_selector_all("a") or pagination.query_selector_all("button") or pagination.query_selector_all("span[onclick]")
-                    
-                    if not page_links:
-                        print("No pagination links found, assuming this is the only page")
-                        has_next_page = False
-                        continue
-                    
-                    print(f"Found {len(page_links)} pagination links")
-                    
-                    # Look for a "Next" button - try various text patterns
-                    next_button = None
-                    next_text_patterns = ['다음', '>', 'next', '→', '▶', 'Next Page', '다음 페이지']
-                    
-                    for elem in page_links:
-                        elem_text = elem.inner_text().strip()
-                        elem_html = elem.inner_html()
-                        print(f"Pagination element: text='{elem_text}', html='{elem_html[:50]}...'")
-                        
-                        # Check text content
-                        if any(pattern in elem_text or pattern == elem_text for pattern in next_text_patterns):
-                            next_button = elem
-                            print(f"Found next button with text: {elem_text}")
+                    if page_scheme:
+                        # Go straight to the next page by URL, jumping over pages stored before a restart
+                        next_page = current_page + 1
+                        while next_page in done_pages:
+                            next_page += 1
+                        if total_pages and next_page > total_pages:
+                            complete = True
                             break
-                        
-                        # Check for SVG or image-based next buttons
-                        if "next" in elem_html.lower() or "arr" in elem_html.lower() or "right" in elem_html.lower():
-                            next_button = elem
-                            print(f"Found next button with HTML containing next/arrow indicators")
+                        if not self.navigate_to_url(build_page_url(page_scheme, next_page)):
                             break
-                        
-                        # Check aria-label
-                        aria_label = elem.get_attribute('aria-label') or ''
-                        if any(pattern in aria_label.lower() for pattern in ['next', '다음']):
-                            next_button = elem
-                            print(f"Found next button with aria-label: {aria_label}")
+                        try:
+                            with self.timings.stage('wait_listing'):
+                                wait_for_listing_rows(self.page)
+                        except Exception:
+                            # Pages past the end have no rows
+                            print(f"No agency rows on page {next_page}, reached last page")
+                            complete = True
                             break
-                    
-                    # If still not found, try to find by position (last item or after current page)
-                    if not next_button and len(page_links) > 1:
-                        # Try to identify current page using known class names
-                        current_page_elem = None
-                        for elem in page_links:
-                            class_attr = elem.get_attribute('class') or ''
-                            # 추가: LF_page_link_current 클래스 확인
-                            if ('LF_page_link_current' in class_attr) or ('active' in class_attr) or ('current' in class_attr):
-                                current_page_elem = elem
-                                print(f"Found current page element with class: {class_attr}")
-                                break
-                        
-                        if current_page_elem:
-                            # Try to get the next sibling
-                            try:
-                                # JavaScript로 현재 페이지 다음 링크 찾기
-                                next_button = self.page.evaluate("""
-                                    (element) => {
-                                        const nextSibling = element.nextElementSibling;
-                                        return nextSibling && nextSibling.tagName.toLowerCase() === 'a' ? nextSibling : null;
-                                    }
-                                """, current_page_elem)
-                                if next_button:
-                                    print("Found next button as sibling of current page element")
-                            except Exception as e:
-                                print(f"Error finding next sibling: {e}")
-                                
-                            # 다음 페이지 버튼을 찾지 못한 경우, LF_page_link_current 다음 버튼 찾기 시도
-                            if not next_button:
-                                try:
-                                    # 숫자 버튼들 중에서 현재 페이지 다음 버튼 찾기
-                                    current_page_num = int(current_page_elem.inner_text().strip())
-                                    print(f"Current page number: {current_page_num}")
-                                    
-                                    for elem in page_links:
-                                        try:
-                                            page_num = int(elem.inner_text().strip())
-                                            if page_num == current_page_num + 1:
-                                                next_button = elem
-                                                print(f"Found next page button with number: {page_num}")
-                                                break
-                                        except ValueError:
-                                            # 숫자가 아닌 텍스트는 무시
-                                            continue
-                                except Exception as e:
-                                    print(f"Error finding next page by number: {e}")
-                        else:
-                            # Try the last link if it might be a next button
-                            last_link = page_links[-1]
-                            last_text = last_link.inner_text().strip()
-                            if last_text not in ['처음', '첫 페이지', '<<', 'first', '맨앞']:
-                                next_button = last_link
-                                print(f"Using last pagination link as potential next button: {last_text}")
-                    
-                    if next_button:
-                        # Check if the button is disabled
-                        cls = next_button.get_attribute('class') or ''
-                        if 'disabled' not in cls and 'none' not in cls:
-                            print("Clicking next page button")
-                            next_button.click()
-                            self.page.wait_for_load_state("networkidle")
-                            time.sleep(3)  # Additional wait for content to load
-                            current_page += 1
-                        else:
-                            print(f"Next button is disabled (class: {cls}), reached last page")
-                            has_next_page = False
+                        current_page = next_page
                     else:
-                        print("No next button found, reached last page")
-                        has_next_page = False
+                        with self.timings.stage('paginate_click'):
+                            clicked = self._click_next_page(category_name, current_page)
+                        if not clicked:
+                            complete = True
+                            break
+                        current_page += 1
                         
                 except Exception as e:
                     print(f"Error with pagination: {e}")
                     import traceback
                     traceback.print_exc()
-                    has_next_page = False
-            
-            # Mark category as scraped in database
-            self.db.mark_category_scraped(category_id)
-            self.categories_scraped += 1
-            self.db.update_scraping_status(
-                self.session_id, 
-                categories_scraped=self.categories_scraped
-            )
+                    break
             
-            print(f"Extracted {len(agencies_data)} agencies for category {category_name}")
+            self.finish_category(category_id, category_name, agencies_data, complete, reached_limit)
             return agencies_data
             
         except Exception as e:
             print(f"Error getting agencies for category {category_name}: {e}")
             return []
     
+    def finish_category(self, category_id, category_name, agencies_data, complete, reached_limit=False):
+        """Mark a category as scraped and, when refreshing, flag agencies it no longer lists
+        
+        complete says whether every listing page was walked; a partial walk
+        (errors or the per-category limit) can't tell which agencies are gone.
+        A category that was walked to the end or to its limit is checkpointed
+        so a resumed run skips it; one cut short by errors is retried.
+        """
+        self.db.mark_category_scraped(category_id)
+        self.progress.increment('categories_scraped')
+        if complete or reached_limit:
+            self.db.complete_category(self.session_id, category_id)
+        
+        if self.refresh and complete and agencies_data:
+            removed = self.db.mark_missing_agencies(category_id, self.session_id)
+            if removed:
+                print(f"Marked {removed} agencies as removed from category {category_name}")
+        
+        print(f"Extracted {len(agencies_data)} agencies for category {category_name}")
+    
+    def _save_agency_detail(self, agency_id, detail_desc):
+        """Store a detailed description and update progress"""
+        self.db.update_agency_detail(agency_id, detail_desc)
+        
+        self.progress.increment('details_scraped')
+        
+        return detail_desc
+    
     def get_agency_detail(self, agency_id, agency_name, agency_idx, agency_detail_url):
         """Get detailed description for an agency"""
         if not agency_detail_url:
@@ -875,6 +1662,13 @@ class IBossScraper:
         try:
             print(f"Getting detailed description for agency: {agency_name}")
             
+            # Try the static HTML first; only render pages without an intro
+            if self.detail_fetcher:
+                detail_desc = self.detail_fetcher.fetch_intro(agency_detail_url)
+                if detail_desc:
+                    return self._save_agency_detail(agency_id, detail_desc)
+                print(f"No intro in static HTML for {agency_name}, falling back to browser")
+            
             # Navigate to agency detail page
             if not self.navigate_to_url(agency_detail_url, retries=2):
                 print(f"Failed to navigate to agency detail page: {agency_detail_url}")
@@ -882,27 +1676,21 @@ class IBossScraper:
             
             # Look for the detailed description
             try:
-                # Try multiple possible selectors with shorter timeout
+                # Wait once for any of the selectors instead of timing out on each in turn
                 intro_elem = None
-                selectors = [
-                    "#_RST_dir > div > div.cont_main > div > div > div:nth-child(2) > div.intro",
-                    "div.intro", 
-                    "div[class*='intro']",
-                    "div.cont_main div[class*='intro']",
-                    "div.cont_main p",
-                    "#_RST_dir p"
-                ]
+                try:
+                    with self.timings.stage('wait_detail'):
+                        wait_for_detail_intro(self.page)
+                except Exception:
+                    print("No detail description selector appeared")
                 
-                # Try each selector with a short timeout
-                for selector in selectors:
-                    try:
-                        print(f"Trying selector: {selector}")
-                        intro_elem = self.page.wait_for_selector(selector, timeout=3000)
+                # Pick the most specific selector that matched
+                with self.timings.stage('query_detail'):
+                    for selector in DETAIL_INTRO_SELECTORS:
+                        intro_elem = self.page.query_selector(selector)
                         if intro_elem:
                             print(f"Found detail description using selector: {selector}")
                             break
-                    except Exception:
-                        print(f"Selector {selector} not found, trying next...")
                 
                 if not intro_elem:
                     print(f"All selectors failed. Taking a screenshot for debugging...")
@@ -928,18 +1716,10 @@ class IBossScraper:
                         print(f"No text content found for {agency_name}")
                         return None
                 else:
-                    detail_desc = intro_elem.inner_text()
-                
-                # Update the database with the detailed description
-                self.db.update_agency_detail(agency_id, detail_desc)
-                
-                self.details_scraped += 1
-                self.db.update_scraping_status(
-                    self.session_id,
-                    details_scraped=self.details_scraped
-                )
+                    with self.timings.stage('extract_detail'):
+                        detail_desc = intro_elem.inner_text()
                 
-                return detail_desc
+                return self._save_agency_detail(agency_id, detail_desc)
                 
             except Exception as e:
                 print(f"Error getting detailed description for {agency_name}: {e}")
@@ -963,25 +1743,18 @@ class IBossScraper:
                 print("No agencies found without detailed descriptions")
                 return
             
-            self.details_total = len(agencies)
-            self.db.update_scraping_status(
-                self.session_id,
-                details_total=self.details_total
-            )
+            self.progress.set('details_total', len(agencies))
             
-            print(f"Found {self.details_total} agencies needing detailed descriptions")
+            print(f"Found {self.progress.details_total} agencies needing detailed descriptions")
             
             for agency in tqdm(agencies):
                 agency_id, agency_name, agency_idx, agency_detail_url = agency
                 
-                # Get detailed description
+                # Get detailed description (requests are paced by the rate limiter)
                 self.get_agency_detail(agency_id, agency_name, agency_idx, agency_detail_url)
-                
-                # Sleep briefly to avoid overloading the server
-                time.sleep(0.5)
-            
-            print(f"Completed scraping detailed descriptions for {self.details_scraped}/{self.details_total} agencies")
             
+            print(f"Completed scraping detailed descriptions for {self.progress.details_scraped}/{self.progress.details_total} agencies")
+        
         except Exception as e:
             print(f"Error in scrape_all_agency_details: {e}")
     
@@ -993,17 +1766,13 @@ class IBossScraper:
             
             if categories:
                 # Filter categories if target_categories is specified
-                if self.target_categories:
-                    print(f"Filtering categories to: {self.target_categories}")
-                    categories = [cat for cat in categories if cat['category_name'] in self.target_categories]
-                    print(f"Found {len(categories)} matching categories")
-                
+                categories = self.filter_categories(categories)
+
                 # Update expected total agencies
-                self.agencies_total = sum(int(cat.get('agency_count', 0)) for cat in categories)
-                self.db.update_scraping_status(
-                    self.session_id, 
-                    agencies_total=self.agencies_total
-                )
+                self.progress.set('agencies_total', sum(int(cat.get('agency_count', 0)) for cat in categories))
+                
+                # Checkpoint the categories; a resumed run skips the finished ones
+                categories = self.pending_categories(categories)
                 
                 # Iterate through each category
                 for category in categories:
@@ -1012,7 +1781,7 @@ class IBossScraper:
                     category_url = category['category_link']
                     
                     # Scrape agencies for this category
-                    self.get_agencies_in_category(category_id, category_name, category_url)
+                    self.get_agencies_in_category(category_id, category_name, category_url, category.get('agency_count'))
                 
                 # Scrape detailed descriptions for all agencies if not skipped
                 if not self.skip_details:
@@ -1020,37 +1789,40 @@ class IBossScraper:
                 else:
                     print("Skipping detailed descriptions as requested")
                 
-                # Export all data to CSV files
-                self.db.export_to_csv(self.data_dir)
-                
-                # Update scraping status
-                self.db.update_scraping_status(
-                    self.session_id, 
-                    status='completed'
-                )
-                
-                print("Scraping completed successfully!")
+                finish_session(self.db, self.progress, self.data_dir, self.export_formats, self.logo_downloader)
             
             else:
                 print("No categories found to scrape.")
-                self.db.update_scraping_status(
-                    self.session_id, 
-                    status='failed'
-                )
+                self.progress.flush(status='failed')
         
         except Exception as e:
             print(f"Error in scrape_all: {e}")
-            self.db.update_scraping_status(
-                self.session_id, 
-                status='failed'
-            )
+            self.progress.flush(status='failed')
         
         finally:
             # Close the browser
             self.close()
     
+    def report_timings(self):
+        """Print the stage timings of this scraper and add them to its session"""
+        self.timings.print_report()
+        if not getattr(self, 'session_id', None):
+            return
+        try:
+            self.db.save_stage_timings(self.session_id, self.timings.report())
+        except Exception as e:
+            print(f"Error saving stage timings: {e}")
+    
     def close(self):
         """Close the browser and database"""
+        if getattr(self, 'resource_filter', None) and self.resource_filter.blocked_count:
+            print(f"Blocked {self.resource_filter.blocked_count} unneeded requests")
+        if getattr(self, 'rate_limiter', None):
+            for line in self.rate_limiter.summary():
+                print(f"Rate limiter {line}")
+        if getattr(self, 'detail_fetcher', None):
+            self.detail_fetcher.close()
+            self.detail_fetcher = None
         if hasattr(self, 'context') and self.context:
             self.context.close()
         if hasattr(self, 'browser') and self.browser:
@@ -1059,8 +1831,21 @@ class IBossScraper:
             self.playwright.stop()
             print("Browser closed.")
         
+        if getattr(self, 'logo_downloader', None):
+            self.logo_downloader.close()
+            self.logo_downloader = None
+        
         if hasattr(self, 'db') and self.db:
+            # Save counters still held in memory (e.g. after Ctrl+C) without
+            # changing the status, so the session stays resumable
+            if getattr(self, 'progress', None):
+                self.progress.flush()
+            # Logos are done by now, so their downloads are included
+            if getattr(self, 'timings', None):
+                self.report_timings()
             self.db.close()
+            # close() may run again on an error path; the database is done
+            self.db = None
             print("Database connection closed.")
 
 
@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Histogram buckets grow by 2^(1/4) (~19%) from 0.1 ms, so percentiles are
+# accurate to within one bucket while memory stays constant per stage
+BUCKET_BASE = 0.0001
+BUCKET_GROWTH = 2 ** 0.25
+
+
+class StageStats:
+    """Count, total and latency histogram of one stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = 0 if seconds <= BUCKET_BASE else math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_GROWTH))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.max, BUCKET_BASE * BUCKET_GROWTH ** bucket)
+        return self.max
+
+
+class StageTimings:
+    """Latency of each scraping stage: navigation, waits, extraction, storage, logos
+
+    Wrap a stage in `with timings.stage("navigate"):`; it works the same in
+    threads and in async code. report() summarizes every stage with its
+    p50/p95/p99, which close() prints and saves to stage_timings.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """Add one sample to a stage"""
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats()
+            self.stages[name].add(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the wrapped block as one sample of a stage (failures included)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self):
+        """One dict per stage, slowest total first"""
+        with self.lock:
+            rows = [
+                {
+                    "stage": name,
+                    "count": stats.count,
+                    "total_seconds": stats.total,
+                    "mean_seconds": stats.total / stats.count,
+                    "p50_seconds": stats.percentile(0.50),
+                    "p95_seconds": stats.percentile(0.95),
+                    "p99_seconds": stats.percentile(0.99),
+                    "max_seconds": stats.max,
+                }
+                for name, stats in self.stages.items() if stats.count
+            ]
+        return sorted(rows, key=lambda row: row["total_seconds"], reverse=True)
+
+    def print_report(self):
+        """Print a table of the stages, in milliseconds"""
+        rows = self.report()
+        if not rows:
+            return
+        print("\nStage timings (ms):")
+        print(f"{'stage':<16} {'count':>7} {'total s':>9} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for row in rows:
+            print(f"{row['stage']:<16} {row['count']:>7} {row['total_seconds']:>9.1f} "
+                  f"{row['mean_seconds'] * 1000:>9.1f} {row['p50_seconds'] * 1000:>9.1f} "
+                  f"{row['p95_seconds'] * 1000:>9.1f} {row['p99_seconds'] * 1000:>9.1f} {row['max_seconds'] * 1000:>9.1f}")
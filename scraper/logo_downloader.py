@@ -0,0 +1,210 @@
+import hashlib
+import os
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import StageTimings
+
+
+# Leading bytes of the image formats logos are served in
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"\x00\x00\x01\x00", "ico"),
+]
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+    "image/bmp": "bmp",
+    "image/x-icon": "ico",
+    "image/vnd.microsoft.icon": "ico",
+}
+
+
+def sniff_image_type(head, content_type=None):
+    """Guess the file extension of an image from its first bytes"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if b"<svg" in head[:512].lower():
+        return "svg"
+
+    # Fall back to what the server claims
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return CONTENT_TYPE_EXTENSIONS.get(content_type, "img")
+
+
+class LogoDownloader:
+    """Background logo downloader fed by a queue
+
+    Logos are stored by content hash ([sha256].[ext]) and every distinct
+    logo URL is fetched at most once per run: agencies that share a URL
+    (e.g. the same agency listed in several categories) wait on the first
+    download instead of starting their own. URLs downloaded in earlier runs
+    are looked up in the logos table.
+    """
+
+    def __init__(self, db, logos_dir, workers=4, chunk_size=64 * 1024, timeout=10, timings=None):
+        self.db = db
+        self.timings = timings or StageTimings()
+        self.logos_dir = logos_dir
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.downloaded = 0
+        self.reused = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+        self.stats_lock = threading.Lock()
+
+        # logo_url -> local path once known, or the agency ids waiting for it
+        self.url_paths = {}
+        self.url_waiters = {}
+        self.url_lock = threading.Lock()
+
+        self.queue = queue.Queue()
+        self.threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"logo-downloader-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, agency_id, logo_url, agency_name=None):
+        """Queue a logo download for an agency that is already in the database"""
+        if not logo_url or logo_url == "N/A":
+            return
+
+        with self.url_lock:
+            logo_path = self.url_paths.get(logo_url)
+            if logo_path is None:
+                if logo_url in self.url_waiters:
+                    # Already queued for another agency; share its download
+                    self.url_waiters[logo_url].append(agency_id)
+                    return
+                self.url_waiters[logo_url] = [agency_id]
+
+        if logo_path:
+            with self.stats_lock:
+                self.reused += 1
+            self.db.update_agency_logo_path(agency_id, logo_path)
+        else:
+            self.queue.put((logo_url, agency_name))
+
+    def _worker(self):
+        """Download queued logos until the stop sentinel arrives"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+
+                logo_url, agency_name = item
+                with self.timings.stage('download_logo'):
+                    logo_path = self.download(logo_url, agency_name)
+
+                with self.url_lock:
+                    waiters = self.url_waiters.pop(logo_url, [])
+                    if logo_path:
+                        self.url_paths[logo_url] = logo_path
+
+                if logo_path:
+                    for agency_id in waiters:
+                        self.db.update_agency_logo_path(agency_id, logo_path)
+            except Exception as e:
+                print(f"Error in logo downloader: {e}")
+            finally:
+                self.queue.task_done()
+
+    def download(self, logo_url, agency_name=None):
+        """Download a logo into the content-addressed store and return its local path"""
+        if not logo_url or logo_url == "N/A":
+            print(f"No logo URL available for {agency_name}")
+            return None
+
+        # Reuse a logo fetched by an earlier run
+        known_path = self.db.get_logo_path(logo_url)
+        if known_path and os.path.exists(known_path):
+            with self.stats_lock:
+                self.reused += 1
+            return known_path
+
+        temp_path = os.path.join(self.logos_dir, f".{threading.get_ident()}.part")
+        try:
+            with self.session.get(logo_url, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    print(f"Failed to download logo for {agency_name}: HTTP status {response.status_code}")
+                    with self.stats_lock:
+                        self.failed += 1
+                    return None
+
+                # Hash while streaming so the file is only written once
+                digest = hashlib.sha256()
+                head = b""
+                size = 0
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(self.chunk_size):
+                        if len(head) < 512:
+                            head += chunk[:512]
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+
+                content_type = response.headers.get("Content-Type")
+
+            extension = sniff_image_type(head, content_type)
+            content_hash = digest.hexdigest()
+            logo_path = os.path.join(self.logos_dir, f"{content_hash}.{extension}")
+
+            if os.path.exists(logo_path):
+                # Same image already stored under another URL
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, logo_path)
+
+            self.db.insert_logo(logo_url, content_hash, logo_path, extension, size)
+            with self.stats_lock:
+                self.downloaded += 1
+                self.bytes_downloaded += size
+            return logo_path
+
+        except Exception as e:
+            print(f"Error downloading logo for {agency_name}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.stats_lock:
+                self.failed += 1
+            return None
+
+    def pending(self):
+        """Number of logos still waiting to be downloaded"""
+        return self.queue.unfinished_tasks
+
+    def join(self):
+        """Wait until every queued logo has been downloaded"""
+        self.queue.join()
+
+    def close(self):
+        """Finish queued downloads, stop the workers and close the session"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.session.close()
+        print(f"Downloaded {self.downloaded} logos ({self.bytes_downloaded / 1024:.1f} KB), "
+              f"reused {self.reused}, {self.failed} failed")
@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
+import importlib.util
 import os
 import time
 import sys
 from arg_parser import parse_args
-from iboss_scraper import IBossScraper, Database
+from iboss_scraper import IBossScraper
+from async_scraper import AsyncIBossScraper
+from workers import Coordinator
+from coordinator import CoordinatorService
+from remote_worker import run_remote_worker
+from metrics import CrawlMetrics, start_metrics_server
 
 def main():
     """Main entry point for the scraper"""
@@ -13,6 +19,18 @@ def main():
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
     
+    # Every browser process would write its own archive to the same path
+    if args.record_har and (args.workers > 0 or args.serve or args.join):
+        print("--record-har needs a single scraper process; it can't be combined with --workers, --serve or --join")
+        sys.exit(2)
+    if args.record_har and args.replay_har:
+        print("--record-har and --replay-har can't be used together")
+        sys.exit(2)
+    # Fail now rather than after the crawl
+    if 'parquet' in args.export_format and importlib.util.find_spec("pyarrow") is None:
+        print("--export-format parquet needs pyarrow (pip install pyarrow)")
+        sys.exit(2)
+    
     # Set database path
     db_path = os.path.join(args.output_dir, os.path.basename(args.db_path))
     
@@ -24,29 +42,94 @@ def main():
     print(f"Skip detailed descriptions: {'Yes' if args.skip_details else 'No'}")
     print(f"Database path: {db_path}")
     print(f"Output directory: {args.output_dir}")
+    print(f"Site: {args.base_url}")
+    if args.record_har or args.replay_har:
+        print(f"Network: {'recording to ' + args.record_har if args.record_har else 'replaying ' + args.replay_har}")
+    print(f"Detail fetch mode: {args.fetch_mode}")
+    print(f"Blocked resources: {', '.join(args.block_resources) or 'None'}" + ("" if args.allow_trackers else " + trackers"))
+    print(f"Engine: {args.engine}" + (f" ({args.concurrency} pages)" if args.engine == 'async' else ""))
+    print(f"Export formats: {', '.join(args.export_format)}")
+    print(f"Refresh mode: {'Yes' if args.refresh else 'No'}")
+    print(f"Resume last session: {'Yes' if args.resume else 'No'}")
+    print(f"Worker processes: {args.workers if args.workers > 0 else 'None'}")
+    if args.serve or args.join:
+        print(f"Distributed mode: {'coordinator on ' + args.serve if args.serve else 'worker for ' + args.join}")
     print(f"===============================")
     
-    # Initialize scraper
-    scraper = IBossScraper(
+    scraper_kwargs = dict(
         headless=args.headless,
         db_path=db_path,
         target_categories=args.categories,
         max_agencies_per_category=args.num_agencies,
         skip_details=args.skip_details,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        fetch_mode=args.fetch_mode,
+        logo_workers=args.logo_workers,
+        block_resources=args.block_resources,
+        block_trackers=not args.allow_trackers,
+        refresh=args.refresh,
+        resume=args.resume,
+        max_rps=args.max_rps,
+        base_url=args.base_url,
+        record_har=args.record_har,
+        replay_har=args.replay_har,
+        export_formats=args.export_format
     )
     
+    # Live metrics; the scraper or coordinator is attached once it exists
+    metrics = None
+    if args.metrics_port:
+        metrics = CrawlMetrics()
+        try:
+            metrics_server = start_metrics_server(metrics, args.metrics_host, args.metrics_port)
+            print(f"Serving metrics on {metrics_server.base_url}/metrics")
+        except OSError as e:
+            print(f"Could not serve metrics on {args.metrics_host}:{args.metrics_port}: {e}")
+            sys.exit(2)
+    
+    # A remote worker stores nothing locally, so there is nothing to export
+    if args.join:
+        try:
+            print("\nJoining coordinator...")
+            run_remote_worker(args.join, scraper_kwargs, metrics=metrics)
+        except KeyboardInterrupt:
+            print("\nWorker interrupted by user.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"\nError running worker: {e}")
+            sys.exit(1)
+        return
+    
+    # Initialize scraper
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        scraper = CoordinatorService(
+            host=host or '127.0.0.1',
+            port=int(port),
+            scraper_kwargs=scraper_kwargs,
+            lease_seconds=args.lease_seconds
+        )
+    elif args.workers > 0:
+        scraper = Coordinator(
+            workers=args.workers,
+            scraper_kwargs=scraper_kwargs,
+            lease_seconds=args.lease_seconds
+        )
+    elif args.engine == 'async':
+        scraper = AsyncIBossScraper(
+            concurrency=args.concurrency,
+            **scraper_kwargs
+        )
+    else:
+        scraper = IBossScraper(**scraper_kwargs)
+    if metrics:
+        metrics.source = scraper
+    
     try:
-        # Run the scraper
+        # Run the scraper; it exports the results in the requested formats when it finishes
         print("\nStarting scraper...")
         scraper.scrape_all()
         
-        # Export results to CSV
-        print("\nExporting results to CSV...")
-        db = Database(db_path)
-        db.export_to_csv(args.output_dir)
-        db.close()
-        
         print(f"\nScraping completed successfully! Results saved to {args.output_dir}")
         
     except KeyboardInterrupt:
@@ -0,0 +1,227 @@
+"""Live crawl metrics in the OpenMetrics / Prometheus text format
+
+main.py --metrics-port N serves them on http://HOST:N/metrics while the
+crawl runs. Every value is read from the running scraper (or coordinator)
+when the endpoint is scraped, so nothing is added to the crawl's hot path.
+"""
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Throughput gauges are averaged over this many seconds of scrapes
+RATE_WINDOW = 60.0
+
+# HELP text of each metric, without the iboss_ prefix
+HELP = {
+    "pages_fetched": "Page navigations and HTTP detail fetches sent",
+    "request_timeouts": "Requests that timed out",
+    "requests_throttled": "Responses with HTTP 429 or 5xx",
+    "request_errors": "Requests that failed with an error other than a timeout",
+    "navigation_retries": "Navigations retried after a failure or throttled response",
+    "categories_scraped": "Categories finished in this session",
+    "agencies_scraped": "Agencies stored in this session",
+    "details_scraped": "Detail descriptions stored in this session",
+    "logo_bytes_downloaded": "Bytes of logo images downloaded",
+    "logos_downloaded": "Logos downloaded",
+    "pages_in_flight": "Requests currently in flight",
+    "agencies_total": "Agencies listed in the categories of this session",
+    "details_total": "Detail pages queued in this session",
+    "db_write_queue_depth": "Writes queued for the database writer thread",
+    "logo_queue_depth": "Logos waiting to be downloaded",
+    "process_rss_bytes": "Resident memory of the scraper process",
+    "browser_rss_bytes": "Resident memory of the browser and worker processes started by the scraper",
+    "pages_per_second": "Pages fetched per second over the last minute",
+    "agencies_per_second": "Agencies stored per second over the last minute",
+    "details_per_second": "Detail descriptions stored per second over the last minute",
+    "uptime_seconds": "Seconds since the metrics endpoint started",
+}
+
+# Counters the per-second gauges are derived from
+RATE_COUNTERS = ("pages_fetched", "agencies_scraped", "details_scraped")
+
+
+def _children(pid):
+    """Direct child pids of a process (Linux /proc)"""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def _rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree_rss(pid):
+    """Resident memory in KB of a process and all of its descendants"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += _rss_kb(current)
+        pending.extend(_children(current))
+    return total
+
+
+class CrawlMetrics:
+    """Collects the metrics of a scraper, Coordinator or CoordinatorService
+
+    The source can be set (or replaced) after the server has started; any
+    part it lacks, such as the rate limiter of a coordinator whose pages
+    are fetched by worker processes, is simply left out.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.started = time.monotonic()
+        self.samples = deque()
+        self.sampled_source = None
+        self.lock = threading.Lock()
+
+    def _counters(self):
+        """Monotonic counters of the source"""
+        source = self.source
+        counters = {}
+
+        limiter = getattr(source, "rate_limiter", None)
+        if limiter:
+            with limiter.lock:
+                hosts = list(limiter.hosts.values())
+                counters["pages_fetched"] = sum(host.requests for host in hosts)
+                counters["request_timeouts"] = sum(host.timeouts for host in hosts)
+                counters["requests_throttled"] = sum(host.throttled for host in hosts)
+                counters["request_errors"] = sum(host.errors for host in hosts)
+        if hasattr(source, "navigation_retries"):
+            counters["navigation_retries"] = source.navigation_retries
+
+        progress = getattr(source, "progress", None)
+        for name in ("categories_scraped", "agencies_scraped", "details_scraped"):
+            if progress is not None and hasattr(progress, name):
+                counters[name] = getattr(progress, name)
+
+        logo_downloader = getattr(source, "logo_downloader", None)
+        if logo_downloader:
+            counters["logo_bytes_downloaded"] = logo_downloader.bytes_downloaded
+            counters["logos_downloaded"] = logo_downloader.downloaded
+        return counters
+
+    def _gauges(self, counters):
+        """Point-in-time values of the source, plus throughput over RATE_WINDOW"""
+        source = self.source
+        gauges = {}
+
+        limiter = getattr(source, "rate_limiter", None)
+        if limiter:
+            with limiter.lock:
+                gauges["pages_in_flight"] = sum(host.in_flight for host in limiter.hosts.values())
+
+        progress = getattr(source, "progress", None)
+        for name in ("agencies_total", "details_total"):
+            if progress is not None and hasattr(progress, name):
+                gauges[name] = getattr(progress, name)
+
+        db = getattr(source, "db", None)
+        if db is not None and hasattr(db, "write_queue"):
+            gauges["db_write_queue_depth"] = db.write_queue.qsize()
+
+        logo_downloader = getattr(source, "logo_downloader", None)
+        if logo_downloader:
+            gauges["logo_queue_depth"] = logo_downloader.queue.qsize()
+
+        # The browsers (and with --workers, the worker processes) are children of this process
+        pid = os.getpid()
+        gauges["process_rss_bytes"] = _rss_kb(pid) * 1024
+        gauges["browser_rss_bytes"] = sum(process_tree_rss(child) for child in _children(pid)) * 1024
+
+        # Rates over the oldest scrape still inside the window (0 until there are two scrapes)
+        now = time.monotonic()
+        with self.lock:
+            if self.sampled_source is not source:
+                # Counters of a new source don't continue the old ones
+                self.samples.clear()
+                self.sampled_source = source
+            self.samples.append((now, counters))
+            while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+                self.samples.popleft()
+            first_time, first = self.samples[0]
+        for name in RATE_COUNTERS:
+            if name in counters:
+                rate = (counters[name] - first.get(name, 0)) / (now - first_time) if now > first_time else 0.0
+                gauges[f"{name.rsplit('_', 1)[0]}_per_second"] = rate
+        gauges["uptime_seconds"] = now - self.started
+        return gauges
+
+    def render(self, openmetrics=True):
+        """The metrics as exposition text; OpenMetrics, or the Prometheus 0.0.4 format"""
+        counters = self._counters()
+        gauges = self._gauges(counters)
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            family = f"iboss_{name}"
+            lines.append(f"# TYPE {family if openmetrics else family + '_total'} counter")
+            lines.append(f"# HELP {family if openmetrics else family + '_total'} {HELP.get(name, name)}")
+            lines.append(f"{family}_total {value}")
+        for name, value in sorted(gauges.items()):
+            family = f"iboss_{name}"
+            lines.append(f"# TYPE {family} gauge")
+            lines.append(f"# HELP {family} {HELP.get(name, name)}")
+            lines.append(f"{family} {round(value, 6) if isinstance(value, float) else value}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves server.metrics on /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self._send(404, b"Not Found", "text/plain")
+            return
+
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        try:
+            body = self.server.metrics.render(openmetrics)
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+            self._send(500, str(e).encode("utf-8"), "text/plain")
+            return
+        self._send(200, body.encode("utf-8"), OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(metrics, host="127.0.0.1", port=9464):
+    """Serve metrics in a background thread; returns the server (its URL is server.base_url)"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,248 @@
+"""Local stand-in for the i-boss agency directory
+
+Serves synthetic versions of the pages the scraper reads:
+
+- /ab-7553: the directory with the category list
+- /ab-7553-[category]?page=N: listing pages (div._list > div rows and a
+  div.paging bar marking the current page with LF_page_link_current)
+- /ab-7554-[idx]: agency detail pages with a div.intro
+- /logo/[idx].png: agency logos
+
+Sizes, latency and throttling are configurable so runs can be scaled and
+compared offline. Run it directly to browse or point the scraper at it:
+
+    python mock_site.py --port 8800 --categories 5 --agencies 120
+    python main.py --base-url http://127.0.0.1:8800 -n 0 --headless
+"""
+import argparse
+import html
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# The first categories match the scraper's default -c filter
+CATEGORY_NAMES = [
+    "종합광고대행사", "페이스북", "인스타그램", "유튜브", "검색광고",
+    "바이럴마케팅", "퍼포먼스마케팅", "브랜딩", "영상제작", "PR",
+]
+
+# 1x1 transparent PNG
+LOGO_PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89"
+    b"\x00\x00\x00\rIDATx\x9cc\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ko"><head><meta charset="utf-8"><title>{title}</title></head>
+<body>{body}</body></html>"""
+
+
+class MockSite:
+    """Deterministic synthetic directory: categories, agencies and their pages
+
+    Agencies are numbered from 1 (their idx); category c lists agencies
+    c * agencies_per_category + 1 onwards, and every shared_every-th agency
+    of a category is also listed in the next category, like agencies that
+    appear in several categories on the live site.
+    """
+
+    def __init__(self, categories=3, agencies_per_category=60, rows_per_page=20, latency=0.0,
+                 jitter=0.0, throttle_rate=0.0, shared_every=10, seed=0):
+        self.categories = categories
+        self.agencies_per_category = agencies_per_category
+        self.rows_per_page = rows_per_page
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.shared_every = shared_every
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+        self.requests = {"directory": 0, "listing": 0, "detail": 0, "logo": 0, "throttled": 0, "not_found": 0}
+        self.requests_lock = threading.Lock()
+
+    def category_name(self, category):
+        if category < len(CATEGORY_NAMES):
+            return CATEGORY_NAMES[category]
+        return f"카테고리 {category + 1}"
+
+    def category_agencies(self, category):
+        """idx of every agency listed in a category, in listing order"""
+        start = category * self.agencies_per_category
+        agencies = list(range(start + 1, start + self.agencies_per_category + 1))
+        if category > 0 and self.shared_every:
+            previous = (category - 1) * self.agencies_per_category
+            agencies += [previous + i for i in range(1, self.agencies_per_category + 1, self.shared_every)]
+        return agencies
+
+    def page_count(self, category):
+        return max(1, -(-len(self.category_agencies(category)) // self.rows_per_page))
+
+    def count(self, kind):
+        with self.requests_lock:
+            self.requests[kind] += 1
+
+    def delay(self):
+        """Simulated server time for one request"""
+        if not self.latency and not self.jitter:
+            return 0
+        with self.random_lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def should_throttle(self):
+        if not self.throttle_rate:
+            return False
+        with self.random_lock:
+            return self.random.random() < self.throttle_rate
+
+    def directory_html(self):
+        items = "".join(
+            f'<li><a href="/ab-7553-{category + 1}">{html.escape(self.category_name(category))}<br>'
+            f'{len(self.category_agencies(category))}개의 대행사</a></li>'
+            for category in range(self.categories)
+        )
+        body = (
+            '<div id="_LF_agency_dir"><div class="bg_fff fix_1050">'
+            f'<div><div class="category_wrap"><ul>{items}</ul></div></div>'
+            '</div></div>'
+        )
+        return PAGE_TEMPLATE.format(title="광고대행사 디렉토리", body=body)
+
+    def listing_html(self, category, page):
+        agencies = self.category_agencies(category)
+        rows = agencies[(page - 1) * self.rows_per_page:page * self.rows_per_page]
+        row_html = "".join(
+            '<div>'
+            f'<a class="link_tit" href="/ab-7553-{category + 1}?idx={idx}"><span class="AB-LF-common">에이전시 {idx}</span></a>'
+            f'<div class="logo_thumb"><a href="/ab-7554-{idx}"><img src="/logo/{idx}.png"></a></div>'
+            f'<div class="url"><a class="link_tit" href="https://agency{idx}.example.com">agency{idx}.example.com</a></div>'
+            f'<p class="desc">에이전시 {idx}의 소개 문구입니다.</p>'
+            '</div>'
+            for idx in rows
+        )
+        links = "".join(
+            f'<a class="{"LF_page_link_current" if number == page else "LF_page_link"}" '
+            f'href="/ab-7553-{category + 1}?page={number}">{number}</a>'
+            for number in range(1, self.page_count(category) + 1)
+        )
+        body = (
+            f'<div class="conts"><h2>{html.escape(self.category_name(category))}</h2>'
+            f'<div class="_list">{row_html}</div>'
+            f'<div class="paging">{links}</div></div>'
+        )
+        return PAGE_TEMPLATE.format(title=self.category_name(category), body=body)
+
+    def detail_html(self, idx):
+        intro = "<br>".join(f"에이전시 {idx} 상세 소개 {line}번째 줄입니다." for line in range(1, 4))
+        body = (
+            '<div id="_RST_dir"><div><div class="cont_main"><div><div>'
+            f'<div><h1>에이전시 {idx}</h1></div>'
+            f'<div><div class="intro">{intro}</div></div>'
+            '</div></div></div></div></div>'
+        )
+        return PAGE_TEMPLATE.format(title=f"에이전시 {idx}", body=body)
+
+    def agency_count(self):
+        return self.categories * self.agencies_per_category
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """Routes requests to the pages of server.site"""
+
+    def do_GET(self):
+        site = self.server.site
+        parsed = urlparse(self.path)
+        path = parsed.path
+
+        delay = site.delay()
+        if delay:
+            time.sleep(delay)
+
+        if site.should_throttle():
+            site.count("throttled")
+            self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": "1"})
+            return
+
+        match = re.fullmatch(r"/ab-7553-(\d+)", path)
+        if path == "/ab-7553":
+            site.count("directory")
+            self._send_html(site.directory_html())
+        elif match and 1 <= int(match.group(1)) <= site.categories:
+            site.count("listing")
+            page = int(parse_qs(parsed.query).get("page", ["1"])[0] or 1)
+            self._send_html(site.listing_html(int(match.group(1)) - 1, page))
+        elif re.fullmatch(r"/ab-7554-\d+", path):
+            site.count("detail")
+            self._send_html(site.detail_html(int(path.rsplit("-", 1)[1])))
+        elif re.fullmatch(r"/logo/\d+\.png", path):
+            site.count("logo")
+            self._send(200, LOGO_PNG, "image/png")
+        else:
+            site.count("not_found")
+            self._send(404, b"Not Found", "text/plain")
+
+    def _send_html(self, page):
+        self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _send(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_site(site, host="127.0.0.1", port=0):
+    """Serve site in a background thread; returns the server (its URL is server.base_url)"""
+    server = ThreadingHTTPServer((host, port), MockSiteHandler)
+    server.daemon_threads = True
+    server.site = site
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args(argv=None):
+    """Parse command line arguments for the mock site"""
+    parser = argparse.ArgumentParser(description='Local mock of the i-boss agency directory')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8800, help='Port to listen on (default: 8800)')
+    parser.add_argument('--categories', type=int, default=3, help='Number of categories (default: 3)')
+    parser.add_argument('--agencies', type=int, default=60, help='Agencies per category (default: 60)')
+    parser.add_argument('--rows-per-page', type=int, default=20, help='Rows per listing page (default: 20)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds around --latency (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 429 and Retry-After (default: 0)')
+    return parser.parse_args(argv)
+
+
+def site_from_args(args):
+    return MockSite(
+        categories=args.categories,
+        agencies_per_category=args.agencies,
+        rows_per_page=args.rows_per_page,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = start_mock_site(site_from_args(args), args.host, args.port)
+    print(f"Mock i-boss site on {server.base_url}/ab-7553 (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
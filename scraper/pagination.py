@@ -0,0 +1,99 @@
+import json
+import math
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+
+PAGINATION_SELECTORS = [
+    "div.paging",
+    "div[class*='paging']",
+    "ul.pagination",
+    "div.pagination",
+    "nav.pagination",
+    ".page_nav",
+    "[class*='pagination']",
+    "[class*='page_navi']",
+    "div.bbsPaging"
+]
+
+# Reads the text, href and class of every pagination link in one round-trip
+PAGINATION_LINKS_JS = """
+() => {
+    for (const selector of %s) {
+        const container = document.querySelector(selector);
+        if (!container) continue;
+        return Array.from(container.querySelectorAll("a"), link => ({
+            text: link.innerText.trim(),
+            href: link.getAttribute('href'),
+            className: link.getAttribute('class') || ''
+        }));
+    }
+    return [];
+}
+""" % json.dumps(PAGINATION_SELECTORS)
+
+
+# Query parameters that usually select the page, preferred when several parameters fit
+PAGE_PARAM_NAMES = ["page", "p", "pg", "pageNo"]
+
+
+def learn_page_url_scheme(current_url, links):
+    """Work out which query parameter selects the listing page
+
+    Looks for numbered pagination links whose hrefs carry their own page
+    number in a query parameter, e.g. "?cate=12&page=3" for the link "3".
+    At least two links with different numbers must agree on the parameter;
+    if several parameters still fit, a known page parameter name decides.
+    Returns a scheme dict for build_page_url, or None when the links only
+    work through JavaScript or the parameter is ambiguous, in which case
+    the pages have to be clicked through.
+    """
+    candidates = None
+    example_url = None
+    numbers = set()
+    for link in links:
+        text = (link.get('text') or '').strip()
+        href = link.get('href')
+        if not text.isdigit() or not href or href.startswith(('javascript:', '#')):
+            continue
+
+        absolute = urljoin(current_url, href)
+        params = parse_qsl(urlparse(absolute).query, keep_blank_values=True)
+        matching = {name for name, value in params if value == text}
+
+        # The page parameter must carry the link's number on every numbered link
+        candidates = matching if candidates is None else candidates & matching
+        example_url = example_url or absolute
+        numbers.add(text)
+
+    # A single link can't tell the page parameter from others that happen to share its number
+    if not candidates or len(numbers) < 2:
+        return None
+    if len(candidates) > 1:
+        known = [name for name in PAGE_PARAM_NAMES if name in candidates]
+        if len(known) != 1:
+            return None
+        candidates = known
+    return {'url': example_url, 'param': next(iter(candidates))}
+
+
+def build_page_url(scheme, page_number):
+    """Build the URL of listing page page_number from a learned scheme"""
+    parsed = urlparse(scheme['url'])
+    params = [(name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+              if name != scheme['param']]
+    params.append((scheme['param'], str(page_number)))
+    return urlunparse(parsed._replace(query=urlencode(params)))
+
+
+def estimate_page_count(agency_count, rows_per_page, max_agencies=0):
+    """Number of listing pages needed to cover the category, or None if unknown"""
+    try:
+        agency_count = int(agency_count)
+    except (TypeError, ValueError):
+        return None
+
+    if max_agencies > 0:
+        agency_count = min(agency_count, max_agencies)
+    if agency_count <= 0 or rows_per_page <= 0:
+        return None
+    return math.ceil(agency_count / rows_per_page)
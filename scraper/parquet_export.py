@@ -0,0 +1,108 @@
+"""Parquet export of the scraper database
+
+Database.export_to_parquet imports this module only when Parquet output is
+asked for, so pyarrow stays an optional dependency.
+"""
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# Arrow type of each declared SQLite column type; anything else is a string
+SQLITE_TYPES = {
+    "INTEGER": pa.int64(),
+    "REAL": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    # Filled by CURRENT_TIMESTAMP, which is UTC
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+
+def table_schema(conn, table):
+    """Arrow schema of a table or view from its declared column types"""
+    return pa.schema([
+        (name, SQLITE_TYPES.get((declared or "").upper(), pa.string()))
+        for _, name, declared, _, _, _ in conn.execute(f"PRAGMA table_info({table})")
+    ])
+
+
+def _to_number(value, convert):
+    """A value as int/float, or None if it isn't numeric (SQLite columns are dynamically typed)"""
+    if value is None:
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _to_bool(value):
+    number = _to_number(value, int)
+    return None if number is None else bool(number)
+
+
+def _to_timestamp(value):
+    """A stored 'YYYY-MM-DD HH:MM:SS' value as an Arrow timestamp, or None if it doesn't parse"""
+    try:
+        return pa.scalar(str(value)).cast(pa.timestamp("us")).value
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+
+
+def to_array(values, field_type):
+    """One column of SQLite values as an Arrow array; values that don't fit the type become null"""
+    if pa.types.is_timestamp(field_type):
+        try:
+            array = pa.array(values, pa.string()).cast(pa.timestamp("us"))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array = pa.array([None if value is None else _to_timestamp(value) for value in values], pa.timestamp("us"))
+        return array.cast(field_type)
+    if pa.types.is_boolean(field_type):
+        return pa.array([_to_bool(value) for value in values], field_type)
+    if pa.types.is_string(field_type):
+        return pa.array([None if value is None else str(value) for value in values], field_type)
+    if pa.types.is_integer(field_type):
+        return pa.array([_to_number(value, int) for value in values], field_type)
+    return pa.array([_to_number(value, float) for value in values], field_type)
+
+
+def record_batches(cursor, schema, chunk_size):
+    """Yield the cursor's rows as record batches of up to chunk_size rows"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [to_array(values, field.type) for field, values in zip(schema, columns)],
+            schema=schema
+        )
+
+
+def write_table(cursor, schema, path, chunk_size, partition_column=None):
+    """Stream a query result to zstd Parquet at path; returns the row count
+
+    With partition_column, path becomes a directory with one hive-style
+    subdirectory per value (path/category_name=.../part-0.parquet).
+    """
+    count = 0
+
+    def counted(batches):
+        nonlocal count
+        for batch in batches:
+            count += batch.num_rows
+            yield batch
+
+    batches = counted(record_batches(cursor, schema, chunk_size))
+    if partition_column:
+        ds.write_dataset(
+            batches, path, schema=schema, format="parquet",
+            partitioning=ds.partitioning(pa.schema([schema.field(partition_column)]), flavor="hive"),
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            basename_template="part-{i}.parquet"
+        )
+    else:
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    return count
@@ -0,0 +1,106 @@
+import threading
+import time
+
+
+# Counters mirrored into the scraping_status table
+COUNTERS = (
+    "categories_total",
+    "categories_scraped",
+    "agencies_total",
+    "agencies_scraped",
+    "details_total",
+    "details_scraped",
+)
+
+
+class ProgressTracker:
+    """In-memory progress counters for a scraping session
+
+    Counters are flushed to scraping_status as a single UPDATE every
+    flush_every events or flush_interval seconds, whichever comes first,
+    and whenever the session status changes.
+    """
+
+    def __init__(self, db, session_id, flush_every=50, flush_interval=5.0):
+        self.db = db
+        self.session_id = session_id
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+        self.dirty = set()
+        self.pending_events = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def restore(self, values):
+        """Continue from counters saved by an earlier run of the same session"""
+        with self.lock:
+            for name in COUNTERS:
+                if values.get(name) is not None:
+                    setattr(self, name, values[name])
+
+    def increment(self, name, amount=1):
+        """Add to a counter, flushing if enough events have piled up"""
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+            self.dirty.add(name)
+            self.pending_events += 1
+            due = (self.pending_events >= self.flush_every or
+                   time.monotonic() - self.last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def set(self, name, value):
+        """Set a counter (totals are rare, so they are written right away)"""
+        with self.lock:
+            setattr(self, name, value)
+            self.dirty.add(name)
+        self.flush()
+
+    def flush(self, status=None):
+        """Write changed counters and an optional status in one UPDATE"""
+        with self.lock:
+            values = {name: getattr(self, name) for name in self.dirty}
+            self.dirty.clear()
+            self.pending_events = 0
+            self.last_flush = time.monotonic()
+
+        if values or status is not None:
+            try:
+                self.db.update_scraping_status(self.session_id, status=status, **values)
+            except Exception as e:
+                print(f"Error saving scraping progress: {e}")
+
+
+class ProgressReporter:
+    """Progress counters of a worker process
+
+    Has the interface of ProgressTracker but forwards each event to the
+    coordinator over a multiprocessing queue; the coordinator's tracker
+    owns the totals and writes them to scraping_status.
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+    def restore(self, values):
+        """Workers never restore; the coordinator holds the session totals"""
+
+    def increment(self, name, amount=1):
+        """Add to a local counter and report the event"""
+        setattr(self, name, getattr(self, name) + amount)
+        self.events.put(("increment", name, amount))
+
+    def set(self, name, value):
+        """Set a local counter and report the new value"""
+        setattr(self, name, value)
+        self.events.put(("set", name, value))
+
+    def flush(self, status=None):
+        """Events are sent as they happen, so there is nothing to flush"""
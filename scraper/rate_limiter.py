@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+from instrumentation import StageTimings
+
+
+# Responses that mean the server wants us to slow down (besides any 5xx)
+THROTTLE_STATUSES = {429}
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter: a random delay in [0, base * 2^attempt], capped"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header given in seconds, or None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestOutcome:
+    """What happened to one limited request; filled in by the caller"""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+    def record(self, status, retry_after=None):
+        """Record the HTTP status (and Retry-After header) of the response"""
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+    @property
+    def throttled(self):
+        return self.status is not None and (self.status in THROTTLE_STATUSES or self.status >= 500)
+
+
+class HostLimit:
+    """Token bucket and concurrency window of one host, adjusted with AIMD"""
+
+    def __init__(self, max_rps, min_rps, max_concurrency):
+        self.max_rps = max_rps
+        self.min_rps = min(min_rps, max_rps) if max_rps else 0
+        # Start halfway and grow while the server keeps up
+        self.rate = max_rps / 2 if max_rps else 0
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.last_decrease = 0.0
+
+        self.requests = 0
+        self.slow = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def refill(self, now):
+        self.tokens = min(1.0, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+
+class AdaptiveRateLimiter:
+    """Per-host request limiter that finds the rate a server tolerates
+
+    Each host gets a token bucket (requests per second) and a concurrency
+    window (requests in flight). Responses faster than target_latency raise
+    both additively; slow responses, timeouts, errors and 429/5xx halve
+    them, at most once per cooldown. Failures also pause the host with
+    exponential backoff plus jitter, or for as long as Retry-After asks.
+    max_rps caps the rate; 0 (or less) disables rate pacing but keeps the
+    concurrency window and backoff.
+    """
+
+    def __init__(self, max_rps=2.0, min_rps=0.1, max_concurrency=4, target_latency=5.0, cooldown=2.0, timings=None):
+        # Time spent waiting for a slot is recorded as the rate_limit_wait stage
+        self.timings = timings or StageTimings()
+        self.max_rps = max_rps if max_rps and max_rps > 0 else 0
+        self.min_rps = min_rps
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, url):
+        """The limits of the host a URL points to"""
+        name = urlparse(url).netloc or "default"
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostLimit(self.max_rps, self.min_rps, self.max_concurrency)
+            return self.hosts[name]
+
+    def _try_acquire(self, host):
+        """Take a token and a concurrency slot; returns 0 on success or how long to wait"""
+        with self.lock:
+            now = time.monotonic()
+            if now < host.blocked_until:
+                return host.blocked_until - now
+            if host.in_flight >= int(host.concurrency):
+                return 0.05
+            if host.rate:
+                host.refill(now)
+                if host.tokens < 1:
+                    return (1 - host.tokens) / host.rate
+                host.tokens -= 1
+            host.in_flight += 1
+            host.requests += 1
+            return 0
+
+    def acquire(self, url):
+        """Block until a request to url may be sent; returns its HostLimit"""
+        host = self.host(url)
+        started = time.perf_counter()
+        while True:
+            delay = self._try_acquire(host)
+            if not delay:
+                self.timings.record('rate_limit_wait', time.perf_counter() - started)
+                return host
+            time.sleep(delay)
+
+    async def acquire_async(self, url):
+        """Wait (without blocking the event loop) until a request to url may be sent"""
+        host = self.host(url)
+        started = time.perf_counter()
+        while True:
+            delay = self._try_acquire(host)
+            if not delay:
+                self.timings.record('rate_limit_wait', time.perf_counter() - started)
+                return host
+            await asyncio.sleep(delay)
+
+    def release(self, host, latency, outcome=None, error=None):
+        """Free the slot of a finished request and adapt the host's limits to how it went"""
+        with self.lock:
+            now = time.monotonic()
+            host.in_flight -= 1
+
+            failed = error is not None or (outcome is not None and outcome.throttled)
+            if not failed and latency <= self.target_latency:
+                # Additive increase: about max_rps/20 per response, one slot per full window
+                host.failures = 0
+                if host.max_rps:
+                    host.rate = min(host.max_rps, host.rate + host.max_rps / 20)
+                host.concurrency = min(host.max_concurrency, host.concurrency + 1 / host.concurrency)
+                return
+
+            if error is not None:
+                if "timeout" in type(error).__name__.lower():
+                    host.timeouts += 1
+                else:
+                    host.errors += 1
+            elif failed:
+                host.throttled += 1
+            else:
+                host.slow += 1
+
+            # Multiplicative decrease, once per cooldown so a burst of failures counts once
+            if now - host.last_decrease >= self.cooldown:
+                if host.max_rps:
+                    host.rate = max(host.min_rps, host.rate / 2)
+                host.concurrency = max(1.0, host.concurrency / 2)
+                host.last_decrease = now
+
+            if failed:
+                retry_after = outcome.retry_after if outcome is not None else None
+                delay = retry_after if retry_after is not None else backoff_delay(host.failures)
+                host.failures += 1
+                host.blocked_until = max(host.blocked_until, now + delay)
+
+    @contextmanager
+    def request(self, url):
+        """Limit one request; record the response status on the yielded RequestOutcome"""
+        host = self.acquire(url)
+        outcome = RequestOutcome()
+        started = time.monotonic()
+        try:
+            yield outcome
+        except Exception as e:
+            self.release(host, time.monotonic() - started, error=e)
+            raise
+        self.release(host, time.monotonic() - started, outcome)
+
+    @asynccontextmanager
+    async def request_async(self, url):
+        """Async version of request()"""
+        host = await self.acquire_async(url)
+        outcome = RequestOutcome()
+        started = time.monotonic()
+        try:
+            yield outcome
+        except Exception as e:
+            self.release(host, time.monotonic() - started, error=e)
+            raise
+        self.release(host, time.monotonic() - started, outcome)
+
+    def summary(self):
+        """One line per host with its current limits and failure counts"""
+        with self.lock:
+            return [
+                f"{name}: {host.requests} requests, "
+                f"{f'{host.rate:.2f} req/s' if host.max_rps else 'no rate cap'}, concurrency {int(host.concurrency)}, "
+                f"{host.slow} slow, {host.throttled} throttled, {host.timeouts} timeouts, {host.errors} errors"
+                for name, host in self.hosts.items()
+            ]
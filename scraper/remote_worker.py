@@ -0,0 +1,207 @@
+import os
+import socket
+import threading
+import time
+import requests
+from iboss_scraper import IBossScraper
+from progress import ProgressTracker
+from workers import work_tasks
+
+
+class RemoteDatabase:
+    """Stand-in for Database in a worker that talks to a coordinator service
+
+    Offers the Database methods IBossScraper and work_tasks() use in a
+    worker. Writes are queued and sent to the coordinator in batches,
+    piggybacked on the next claim or once batch_size writes have piled up;
+    the coordinator applies them to the canonical database in order. Each
+    batch carries a sequence number and is resent with the same number
+    until the coordinator answers, which then applies it only once.
+    """
+
+    def __init__(self, base_url, worker, batch_size=20, timeout=30, retries=3):
+        self.base_url = base_url.rstrip("/")
+        self.worker = worker
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+
+        self.pending = []
+        # The batch sent last, kept until a response confirms it arrived
+        self.unconfirmed = None
+        self.batch_seq = 0
+        self.lock = threading.Lock()
+
+        # Rows the coordinator sent along with claimed tasks
+        self.categories = {}
+        self.agencies = {}
+        self.done_pages = {}
+
+    def _request(self, method, path, payload=None, retry_read_timeout=True):
+        """Send a request to the coordinator, retrying connection errors
+
+        With retry_read_timeout=False a request that timed out waiting for
+        the answer is not sent again, as the coordinator may have handled it.
+        """
+        for attempt in range(self.retries):
+            try:
+                response = self.session.request(method, self.base_url + path, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException as e:
+                if attempt == self.retries - 1 or (isinstance(e, requests.ReadTimeout) and not retry_read_timeout):
+                    raise
+                print(f"Coordinator request {path} failed ({e}), retrying...")
+                time.sleep(2 ** attempt)
+
+    def _send_with_results(self, path, payload, retry_read_timeout=True):
+        """Send a request carrying the queued writes as a numbered batch
+
+        A batch that may not have arrived is sent again, with the same
+        number, on the next request; writes queued meanwhile wait for it.
+        """
+        with self.lock:
+            if self.unconfirmed is None and self.pending:
+                self.batch_seq += 1
+                self.unconfirmed = {"seq": self.batch_seq, "results": self.pending}
+                self.pending = []
+            batch = self.unconfirmed or {"seq": None, "results": []}
+
+        response = self._request(
+            "POST", path, dict(payload, worker=self.worker, seq=batch["seq"], results=batch["results"]),
+            retry_read_timeout=retry_read_timeout
+        )
+        with self.lock:
+            if self.unconfirmed is batch:
+                self.unconfirmed = None
+        return response
+
+    def _queue(self, op, **args):
+        with self.lock:
+            self.pending.append({"op": op, "args": args})
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Send the queued writes now"""
+        while self.pending or self.unconfirmed:
+            self._send_with_results("/results", {})
+
+    def session_info(self):
+        """Session id and crawl settings chosen by the coordinator"""
+        return self._request("GET", "/session")
+
+    # Task queue; lease_seconds and max_attempts are set by the coordinator
+
+    def claim_task(self, session_id, task_type, owner, lease_seconds, max_attempts=3):
+        """Claim the next task, sending the queued writes along"""
+        try:
+            # Claiming again after a timeout could lease a second task nobody works on
+            task = self._send_with_results("/claim", {"task_type": task_type}, retry_read_timeout=False)["task"]
+        except requests.ReadTimeout:
+            print("Claim timed out; a task it may have leased is reclaimed when the lease expires")
+            return None
+        if task:
+            if task.get("category"):
+                self.categories[task["category_id"]] = tuple(task["category"])
+                self.done_pages[task["category_id"]] = set(task.get("done_pages", []))
+            if task.get("agency"):
+                self.agencies[task["agency_id"]] = tuple(task["agency"])
+        return task
+
+    def count_open_tasks(self, session_id, task_type, max_attempts=3):
+        """Ask the coordinator how many tasks are leased or claimable"""
+        return self._send_with_results("/open", {"task_type": task_type})["open"]
+
+    def extend_lease(self, session_id, task_key, owner, lease_seconds):
+        self._request("POST", "/heartbeat", {"worker": self.worker, "task_key": task_key})
+
+    def complete_task(self, session_id, task_key):
+        self._queue("complete_task", task_key=task_key)
+
+    def release_task(self, session_id, task_key, owner):
+        self._queue("release_task", task_key=task_key)
+
+    # Reads answered from the rows sent with the claimed task
+
+    def get_category_by_id(self, category_id):
+        return self.categories.get(category_id)
+
+    def get_agency_by_id(self, agency_id):
+        return self.agencies.get(agency_id)
+
+    def get_done_pages(self, session_id, category_id):
+        return set(self.done_pages.get(category_id, ()))
+
+    # Writes forwarded to the coordinator
+
+    def insert_agencies_many(self, category_id, category_name, agencies, session_id=None, refresh=False):
+        """Queue a listing page; ids are assigned by the coordinator, so None is returned for each"""
+        self._queue("insert_agencies_many", category_id=category_id, category_name=category_name, agencies=agencies)
+        return [None] * len(agencies)
+
+    def complete_page(self, session_id, category_id, page):
+        self._queue("complete_page", category_id=category_id, page=page)
+
+    def mark_category_scraped(self, category_id):
+        self._queue("mark_category_scraped", category_id=category_id)
+
+    def complete_category(self, session_id, category_id):
+        self._queue("complete_category", category_id=category_id)
+
+    def mark_missing_agencies(self, category_id, session_id):
+        """Queue the removal check; the coordinator reports the count"""
+        self._queue("mark_missing_agencies", category_id=category_id)
+        return 0
+
+    def update_agency_detail(self, agency_id, detail_desc):
+        self._queue("update_agency_detail", agency_id=agency_id, detail_desc=detail_desc)
+
+    def save_stage_timings(self, session_id, rows):
+        self._queue("save_stage_timings", rows=rows)
+
+    def update_scraping_status(self, session_id, **kwargs):
+        """The coordinator keeps the session counters"""
+
+    def close(self):
+        """Send the remaining writes and close the HTTP session"""
+        try:
+            self.flush()
+        finally:
+            self.session.close()
+
+
+def run_remote_worker(coordinator_url, scraper_kwargs, metrics=None):
+    """Join a coordinator service and work on its tasks until none are left
+
+    metrics, a CrawlMetrics, is pointed at the worker's scraper once it exists.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    db = RemoteDatabase(coordinator_url, owner)
+    session = db.session_info()
+    print(f"Worker {owner} joined session {session['session_id']} at {coordinator_url}")
+
+    # The coordinator decides what is crawled; logos are downloaded there too
+    scraper_kwargs = dict(scraper_kwargs)
+    scraper_kwargs.pop('resume', None)
+    scraper_kwargs.update(
+        max_agencies_per_category=session['max_agencies_per_category'],
+        refresh=session['refresh'],
+        skip_details=session['skip_details'],
+        logo_workers=0
+    )
+
+    # Counters stay local: the coordinator counts the results it applies, so there is nothing to restore
+    progress = ProgressTracker(db, session['session_id'])
+    scraper = IBossScraper(session_id=session['session_id'], db=db, progress=progress, **scraper_kwargs)
+    if metrics:
+        metrics.source = scraper
+    try:
+        claimed = work_tasks(scraper, 'category', owner, session['lease_seconds'], session['max_attempts'])
+        if not session['skip_details']:
+            claimed += work_tasks(scraper, 'detail', owner, session['lease_seconds'], session['max_attempts'])
+        print(f"Worker {owner} finished after {claimed} tasks")
+    finally:
+        scraper.close()
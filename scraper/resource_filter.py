@@ -0,0 +1,80 @@
+from urllib.parse import urlparse
+
+
+# Only DOM text and img[src] attributes are scraped, so none of these are needed
+DEFAULT_BLOCKED_RESOURCE_TYPES = ("image", "media", "font", "stylesheet")
+
+# Analytics, ad and tracking hosts that keep the network busy and delay networkidle
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "facebook.com",
+    "wcs.naver.net",
+    "wcs.naver.com",
+    "ssl.pstatic.net/tveta",
+    "adcr.naver.com",
+    "t1.daumcdn.net/kas",
+    "kakao.com/v1/pixel",
+    "criteo.com",
+    "criteo.net",
+    "hotjar.com",
+    "clarity.ms",
+    "scorecardresearch.com",
+    "mobon.net",
+    "dable.io",
+)
+
+
+class ResourceFilter:
+    """Abort requests for resource types and tracker hosts the scraper doesn't need"""
+
+    def __init__(self, blocked_types=DEFAULT_BLOCKED_RESOURCE_TYPES, block_trackers=True, tracker_domains=TRACKER_DOMAINS):
+        self.blocked_types = set(blocked_types or ())
+        self.tracker_domains = tuple(tracker_domains) if block_trackers else ()
+        self.blocked_count = 0
+
+    @property
+    def enabled(self):
+        """Whether the filter blocks anything at all"""
+        return bool(self.blocked_types or self.tracker_domains)
+
+    def is_tracker(self, url):
+        """Check whether a URL belongs to a known tracker domain"""
+        parsed = urlparse(url)
+        host = parsed.hostname or ""
+        host_path = host + parsed.path
+        for domain in self.tracker_domains:
+            if "/" in domain:
+                if host_path.startswith(domain):
+                    return True
+            elif host == domain or host.endswith("." + domain):
+                return True
+        return False
+
+    def should_block(self, resource_type, url):
+        """Decide whether a request should be aborted"""
+        return resource_type in self.blocked_types or self.is_tracker(url)
+
+    def handle_route(self, route):
+        """Route handler for sync Playwright contexts"""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_count += 1
+            route.abort()
+        else:
+            # Fall back so other routes registered on the context still run
+            route.fallback()
+
+    async def handle_route_async(self, route):
+        """Route handler for async Playwright contexts"""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_count += 1
+            await route.abort()
+        else:
+            await route.fallback()
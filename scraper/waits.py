@@ -0,0 +1,62 @@
+"""Condition-based waits that replace fixed sleeps
+
+Each helper wraps page.wait_for_function, which returns as soon as the
+condition holds and raises a TimeoutError otherwise. The helpers accept
+both sync and async Playwright pages; async callers await the result.
+"""
+import json
+
+LISTING_ROW_SELECTORS = ["div._list > div", "div.conts div[class^='list_'] > div"]
+
+DETAIL_INTRO_SELECTORS = [
+    "#_RST_dir > div > div.cont_main > div > div > div:nth-child(2) > div.intro",
+    "div.intro",
+    "div[class*='intro']",
+    "div.cont_main div[class*='intro']",
+    "div.cont_main p",
+    "#_RST_dir p"
+]
+
+# Either row layout, as one CSS selector list
+_ROWS = "document.querySelectorAll(%s)" % json.dumps(", ".join(LISTING_ROW_SELECTORS))
+
+# Identifies the listing currently shown: the current-page marker plus the
+# first and last rows, so it changes whenever pagination swaps the list
+LISTING_SIGNATURE_JS = """
+() => {
+    const rows = %s;
+    const marker = document.querySelector("[class*='LF_page_link_current'], [class*='paging'] .current, [class*='paging'] .active");
+    const text = elem => elem ? elem.textContent.trim() : '';
+    return [text(marker), rows.length, text(rows[0]), text(rows[rows.length - 1])].join('|');
+}
+""" % _ROWS
+
+LISTING_ROWS_JS = "() => %s.length > 0" % _ROWS
+
+LISTING_CHANGED_JS = """
+(previous) => (%s)() !== previous && %s.length > 0
+""" % (LISTING_SIGNATURE_JS.strip(), _ROWS)
+
+DETAIL_READY_JS = """
+() => %s.some(selector => document.querySelector(selector))
+""" % json.dumps(DETAIL_INTRO_SELECTORS)
+
+
+def wait_for_listing_rows(page, timeout=10000):
+    """Wait until at least one agency row is rendered"""
+    return page.wait_for_function(LISTING_ROWS_JS, timeout=timeout)
+
+
+def listing_signature(page):
+    """Read the signature of the listing currently shown"""
+    return page.evaluate(LISTING_SIGNATURE_JS)
+
+
+def wait_for_listing_change(page, previous_signature, timeout=15000):
+    """Wait until pagination has replaced the listing that had previous_signature"""
+    return page.wait_for_function(LISTING_CHANGED_JS, arg=previous_signature, timeout=timeout)
+
+
+def wait_for_detail_intro(page, timeout=10000):
+    """Wait until any of the detail description selectors matches"""
+    return page.wait_for_function(DETAIL_READY_JS, timeout=timeout)
@@ -0,0 +1,299 @@
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+from iboss_scraper import IBossScraper, Database, finish_session
+from progress import ProgressReporter, ProgressTracker
+from instrumentation import StageTimings
+
+
+# Seconds an idle worker waits before looking for expired leases again
+POLL_INTERVAL = 2.0
+
+
+class LeaseHeartbeat:
+    """Background thread that keeps extending the lease of the current task
+
+    A worker that crashes stops extending its lease, so the task becomes
+    claimable again once lease_seconds have passed.
+    """
+
+    def __init__(self, db, session_id, owner, lease_seconds):
+        self.db = db
+        self.session_id = session_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.task_key = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            task_key = self.task_key
+            if task_key:
+                try:
+                    self.db.extend_lease(self.session_id, task_key, self.owner, self.lease_seconds)
+                except Exception as e:
+                    print(f"Error extending lease of {task_key}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_worker(worker_index, session_id, task_type, scraper_kwargs, events, lease_seconds, max_attempts):
+    """Entry point of a worker process: claim tasks of one type until none are left"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker_index} ({owner}) started on {task_type} tasks")
+
+    scraper = IBossScraper(session_id=session_id, progress=ProgressReporter(events), **scraper_kwargs)
+    try:
+        claimed = work_tasks(scraper, task_type, owner, lease_seconds, max_attempts)
+        print(f"Worker {worker_index} finished after {claimed} {task_type} tasks")
+    finally:
+        scraper.close()
+
+
+def work_tasks(scraper, task_type, owner, lease_seconds, max_attempts):
+    """Claim and run tasks of one type until none are left; returns how many were claimed
+
+    scraper.db may be a local Database or a proxy to a remote coordinator;
+    both offer the same lease methods.
+    """
+    db = scraper.db
+    session_id = scraper.session_id
+    heartbeat = LeaseHeartbeat(db, session_id, owner, lease_seconds)
+    claimed = 0
+
+    try:
+        while True:
+            task = db.claim_task(session_id, task_type, owner, lease_seconds, max_attempts)
+            if not task:
+                # Other workers may still crash and leave leases behind
+                if db.count_open_tasks(session_id, task_type, max_attempts) == 0:
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            claimed += 1
+            heartbeat.task_key = task['task_key']
+            try:
+                if task_type == 'category':
+                    run_category_task(scraper, task)
+                    # Still leased only if the category was cut short; give it back for a retry
+                    db.release_task(session_id, task['task_key'], owner)
+                else:
+                    # Requests are paced by the scraper's rate limiter
+                    if run_detail_task(scraper, task):
+                        db.complete_task(session_id, task['task_key'])
+                    else:
+                        db.release_task(session_id, task['task_key'], owner)
+            except Exception as e:
+                print(f"Worker {owner} failed on {task['task_key']}: {e}")
+                db.release_task(session_id, task['task_key'], owner)
+            finally:
+                heartbeat.task_key = None
+
+        return claimed
+
+    finally:
+        heartbeat.stop()
+
+
+def run_category_task(scraper, task):
+    """Scrape the listing pages of a claimed category"""
+    category = scraper.db.get_category_by_id(task['category_id'])
+    if not category:
+        print(f"Category {task['category_id']} no longer exists, skipping")
+        scraper.db.complete_task(scraper.session_id, task['task_key'])
+        return
+
+    category_id, category_name, category_url, agency_count = category
+    scraper.get_agencies_in_category(category_id, category_name, category_url, agency_count)
+
+
+def run_detail_task(scraper, task):
+    """Fetch the detail page of a claimed agency; returns True once it needs no retry"""
+    agency = scraper.db.get_agency_by_id(task['agency_id'])
+    if not agency:
+        print(f"Agency {task['agency_id']} no longer exists, skipping")
+        return True
+
+    agency_id, agency_name, agency_idx, agency_detail_url = agency
+    if not agency_detail_url:
+        return True
+    return scraper.get_agency_detail(agency_id, agency_name, agency_idx, agency_detail_url) is not None
+
+
+class Coordinator:
+    """Runs a crawl across several worker processes, each with its own browser
+
+    Categories and detail pages are queued in the work_queue table of the
+    session; workers lease them one at a time. Progress events from the
+    workers are aggregated here and written to scraping_status. Workers that
+    exit abnormally are restarted while tasks remain, and their leases are
+    reclaimed once they expire.
+    """
+
+    def __init__(self, workers, scraper_kwargs, lease_seconds=300, max_attempts=3, max_restarts=None):
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_restarts = self.workers * 2 if max_restarts is None else max_restarts
+        self.scraper_kwargs = dict(scraper_kwargs)
+        self.resume = self.scraper_kwargs.pop('resume', False)
+        self.db_path = self.scraper_kwargs.get('db_path')
+        self.data_dir = self.scraper_kwargs.get('output_dir')
+        self.skip_details = self.scraper_kwargs.get('skip_details', False)
+        self.export_formats = self.scraper_kwargs.get('export_formats', ('csv',))
+
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}
+        self.db = None
+        self.progress = None
+        self.session_id = None
+        # Stages run by the coordinator itself; each worker reports its own
+        self.timings = StageTimings()
+
+    def prepare_session(self):
+        """Read the categories in-process and queue them; returns False if there are none"""
+        scraper = IBossScraper(resume=self.resume, **self.scraper_kwargs)
+        try:
+            categories = scraper.get_categories()
+            if not categories:
+                print("No categories found to scrape.")
+                scraper.progress.flush(status='failed')
+                return False
+
+            categories = scraper.filter_categories(categories)
+            scraper.progress.set('agencies_total', sum(int(cat.get('agency_count', 0)) for cat in categories))
+            scraper.pending_categories(categories)
+            scraper.progress.flush()
+
+            self.session_id = scraper.session_id
+            self.resume = scraper.resume
+            return True
+        finally:
+            scraper.close()
+
+    def open_session(self):
+        """Prepare the session and open the database and progress tracker the coordinator writes with"""
+        if not self.prepare_session():
+            return False
+
+        self.db = Database(self.db_path, timings=self.timings)
+        self.progress = ProgressTracker(self.db, self.session_id)
+        self.progress.restore(self.db.get_scraping_status(self.session_id))
+        if self.resume:
+            reopened = self.db.reopen_tasks(self.session_id)
+            if reopened:
+                print(f"Reopened {reopened} unfinished tasks of session {self.session_id}")
+        return True
+
+    def queue_details(self):
+        """Queue a detail task for every agency still without a detailed description"""
+        agencies = self.db.get_agencies_without_details()
+        self.progress.set('details_total', len(agencies))
+        self.db.enqueue_details(self.session_id, [agency[0] for agency in agencies])
+
+    def _start_worker(self, worker_index, task_type, events):
+        process = self.context.Process(
+            target=run_worker,
+            args=(worker_index, self.session_id, task_type, self.scraper_kwargs, events, self.lease_seconds, self.max_attempts),
+            name=f"iboss-worker-{worker_index}"
+        )
+        process.start()
+        return process
+
+    def _drain_events(self, events, timeout=None):
+        """Apply the progress events reported by the workers"""
+        while True:
+            try:
+                kind, name, value = events.get(timeout=timeout) if timeout else events.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'increment':
+                self.progress.increment(name, value)
+            else:
+                self.progress.set(name, value)
+            timeout = None
+
+    def run_phase(self, task_type):
+        """Run workers until every task of one type is done or out of attempts"""
+        open_tasks = self.db.count_open_tasks(self.session_id, task_type, self.max_attempts)
+        if not open_tasks:
+            print(f"No {task_type} tasks left to run")
+            return
+
+        workers = min(self.workers, open_tasks)
+        print(f"\nStarting {workers} workers for {open_tasks} {task_type} tasks...")
+        events = self.context.Queue()
+        self.processes = {i: self._start_worker(i, task_type, events) for i in range(workers)}
+        restarts = 0
+
+        while self.processes:
+            self._drain_events(events, timeout=1.0)
+            for worker_index, process in list(self.processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                del self.processes[worker_index]
+                if process.exitcode == 0:
+                    continue
+
+                print(f"Worker {worker_index} exited with code {process.exitcode}")
+                if restarts < self.max_restarts and self.db.count_open_tasks(self.session_id, task_type, self.max_attempts):
+                    restarts += 1
+                    print(f"Restarting worker {worker_index} ({restarts}/{self.max_restarts})")
+                    self.processes[worker_index] = self._start_worker(worker_index, task_type, events)
+
+        self._drain_events(events)
+        self.progress.flush()
+
+    def scrape_all(self):
+        """Scrape all categories, agencies, and their details with worker processes"""
+        try:
+            if not self.open_session():
+                return
+
+            self.run_phase('category')
+
+            # Scrape detailed descriptions for all agencies if not skipped
+            if not self.skip_details:
+                self.queue_details()
+                self.run_phase('detail')
+            else:
+                print("Skipping detailed descriptions as requested")
+
+            # Each worker process downloads the logos of its own pages before it exits
+            finish_session(self.db, self.progress, self.data_dir, self.export_formats)
+
+        except Exception as e:
+            print(f"Error in scrape_all: {e}")
+            if self.progress:
+                self.progress.flush(status='failed')
+
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop any running workers and close the database"""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.processes = {}
+
+        if self.db:
+            self.timings.print_report()
+            if self.session_id:
+                try:
+                    self.db.save_stage_timings(self.session_id, self.timings.report())
+                except Exception as e:
+                    print(f"Error saving stage timings: {e}")
+            self.db.close()
+            self.db = None
+            print("Database connection closed.")